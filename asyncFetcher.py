@@ -0,0 +1,114 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from instrumentation import span
+
+
+class TokenBucket:
+    # Allows `rate` requests per second on average with bursts of up to `capacity`
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _run(coroutine):
+    # asyncio.run refuses to start inside a running event loop (Jupyter, async callers), so there the
+    # coroutine gets its own loop on a worker thread; async callers can also await fetch_async directly
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+class AsyncFetcher:
+    # Wraps any provider with a fetch(tickers, start_date, end_date) method and requests one symbol per
+    # call, concurrently; it is itself a provider, so PriceStore(provider=AsyncFetcher(...)) just works
+    def __init__(self, provider, max_concurrency=8, rate=None, burst=None, retries=3, backoff=0.5,
+                 max_backoff=30.0, timeout=60.0):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.report = pd.DataFrame(columns=['Ticker', 'Start', 'End', 'Status', 'Attempts', 'Rows', 'Seconds',
+                                            'Error'])
+
+    def delay(self, attempt):
+        # Exponential backoff with full jitter so retries from many symbols do not arrive together
+        return random.uniform(0, min(self.backoff * 2 ** (attempt - 1), self.max_backoff))
+
+    async def _fetch_symbol(self, ticker, start_date, end_date, semaphore, bucket):
+        started = time.perf_counter()
+        error = None
+        for attempt in range(1, self.retries + 2):
+            # The semaphore is held while a request is in flight, not while backing off. A request that times
+            # out cannot be stopped, so its thread keeps the slot until it returns and only then is retried
+            async with semaphore:
+                if bucket is not None:
+                    await bucket.acquire()
+                request = asyncio.ensure_future(asyncio.to_thread(self.provider.fetch, [ticker], start_date,
+                                                                  end_date))
+                try:
+                    data = await asyncio.wait_for(asyncio.shield(request), self.timeout)
+                except Exception as exc:
+                    error = f'{type(exc).__name__}: {exc}'
+                    await asyncio.wait([request])
+                else:
+                    prices = data[ticker].dropna() if ticker in data else pd.Series(dtype=float)
+                    prices.index = pd.DatetimeIndex(prices.index).tz_localize(None)
+                    status = 'ok' if len(prices) else 'empty'
+                    return prices, [ticker, start_date, end_date, status, attempt, len(prices),
+                                    time.perf_counter() - started, None]
+            if attempt <= self.retries:
+                await asyncio.sleep(self.delay(attempt))
+        return None, [ticker, start_date, end_date, 'failed', self.retries + 1, 0, time.perf_counter() - started,
+                      error]
+
+    async def fetch_async(self, tickers, start_date, end_date):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        bucket = TokenBucket(self.rate, self.burst) if self.rate else None
+        results = await asyncio.gather(*(self._fetch_symbol(ticker, start_date, end_date, semaphore, bucket)
+                                         for ticker in tickers))
+        report = pd.DataFrame([row for _, row in results], columns=self.report.columns)
+        # Symbols that answered with no rows still get an (empty) column; only failed symbols are left out
+        prices = {ticker: series for ticker, (series, _) in zip(tickers, results) if series is not None}
+        return pd.DataFrame(prices), report
+
+    def fetch(self, tickers, start_date, end_date):
+        tickers = list(tickers)
+        with span('fetch', tickers=len(tickers)) as current:
+            data, report = _run(self.fetch_async(tickers, start_date, end_date))
+            current.set(rows=len(data))
+            current.count('failed', int((report['Status'] == 'failed').sum()))
+            current.count('retries', int((report['Attempts'] - 1).sum()))
+        self.report = report if self.report.empty else pd.concat([self.report, report], ignore_index=True)
+        return data
+
+    def failures(self):
+        return self.report[self.report['Status'] != 'ok']
+
+    def errors(self):
+        # Last error for each symbol that ran out of retries
+        failed = self.report[self.report['Status'] == 'failed']
+        return dict(zip(failed['Ticker'], failed['Error']))
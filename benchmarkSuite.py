@@ -0,0 +1,151 @@
+import argparse
+import cProfile
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import metrics
+from pairSelection import top_pairs
+from pairScreening import screen_pairs
+from portfolioBacktest import PortfolioBacktester
+
+
+def synthetic_panel(n_tickers, n_days, seed=0, cointegrated_fraction=.5, group_size=4):
+    # Cointegrated groups share one random-walk factor plus stationary noise; the rest are independent walks
+    rng = np.random.default_rng(seed)
+    n_grouped = int(n_tickers * cointegrated_fraction) // group_size * group_size
+    factors = np.cumsum(rng.normal(0, 1, (n_days, max(n_grouped // group_size, 1))), axis=0)
+    loadings = rng.uniform(.5, 2, n_grouped)
+    grouped = factors[:, np.arange(n_grouped) // group_size] * loadings + rng.normal(0, 1, (n_days, n_grouped))
+    walks = np.cumsum(rng.normal(0, 1, (n_days, n_tickers - n_grouped)), axis=0)
+    levels = np.concatenate([grouped, walks], axis=1)
+    prices = levels - levels.min() + 10
+    index = pd.bdate_range('2000-01-03', periods=n_days, name='Date')
+    return pd.DataFrame(prices, index=index, columns=[f'T{j}' for j in range(n_tickers)])
+
+
+def stages(panel, top_n, coint_method):
+    state = {}
+
+    def correlation():
+        state['correlation'] = panel.corr()
+
+    def top_k():
+        state['candidates'] = top_pairs(state['correlation'], top_n)
+
+    def screen():
+        state['pairs'] = screen_pairs(panel, state['candidates'], max_pairs=top_n, max_workers=1,
+                                      coint_method=coint_method)
+        # Keep the later stages measurable even if nothing passes the screen
+        state['pairs'] = state['pairs'] or state['candidates']
+
+    def signals():
+        state['backtester'] = PortfolioBacktester(state['pairs'], prices=panel)
+        state['positions'] = state['backtester'].signals()
+
+    def portfolio():
+        # Aggregation only: returns and equity from the positions the signals stage produced
+        backtester = state['backtester']
+        state['returns'] = backtester.strategy_returns(state['positions'])
+        equity = 1000.0 * np.cumprod(np.add(1, state['returns'], dtype=np.float64), axis=0)
+        state['equity'] = pd.DataFrame(equity, index=backtester.index, columns=backtester.names)
+        state['total'] = state['equity'].sum(axis=1)
+
+    def performance():
+        state['metrics'] = metrics.metrics_table(state['returns'])
+
+    return [('correlation', correlation), ('top_k', top_k), ('screen', screen), ('signals', signals),
+            ('portfolio', portfolio), ('metrics', performance)]
+
+
+def profile_stage(name, stage, profiler, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        profile = Profiler()
+        profile.start()
+        stage()
+        profile.stop()
+        with open(os.path.join(output_dir, f'{name}.html'), 'w') as f:
+            f.write(profile.output_html())
+    else:
+        profile = cProfile.Profile()
+        profile.runcall(stage)
+        profile.dump_stats(os.path.join(output_dir, f'{name}.prof'))
+
+
+def run_suite(n_tickers=200, n_days=756, seed=0, repeat=3, top_n=50, coint_method='engle_granger',
+              profiler=None, profile_dir='benchmarks/profiles'):
+    panel = synthetic_panel(n_tickers, n_days, seed)
+    results = {}
+    for name, stage in stages(panel, top_n, coint_method):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            stage()
+            timings.append(time.perf_counter() - start)
+
+        # Peak memory is measured on a separate call so tracing does not skew the timings
+        tracemalloc.start()
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if profiler:
+            profile_stage(name, stage, profiler, profile_dir)
+        results[name] = {'seconds': min(timings), 'peak_mb': peak / 2 ** 20}
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record(results, config, history_path='benchmarks/history.json'):
+    history = []
+    if os.path.exists(history_path):
+        with open(history_path) as f:
+            history = json.load(f)
+
+    # Compare against the last run with the same panel configuration
+    previous = next((entry for entry in reversed(history) if entry['config'] == config), None)
+    history.append({'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                    'config': config, 'stages': results})
+    os.makedirs(os.path.dirname(history_path) or '.', exist_ok=True)
+    with open(history_path, 'w') as f:
+        json.dump(history, f, indent=2)
+    return previous
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pair search and backtest hot paths")
+    parser.add_argument('--tickers', type=int, default=200)
+    parser.add_argument('--days', type=int, default=756)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top-n', type=int, default=50)
+    parser.add_argument('--coint-method', default='engle_granger', choices=['engle_granger', 'statsmodels'])
+    parser.add_argument('--history', default='benchmarks/history.json')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'])
+    args = parser.parse_args()
+
+    config = {'tickers': args.tickers, 'days': args.days, 'seed': args.seed, 'top_n': args.top_n,
+              'coint_method': args.coint_method}
+    results = run_suite(args.tickers, args.days, args.seed, args.repeat, args.top_n, args.coint_method,
+                        args.profile)
+    previous = record(results, config, args.history)
+
+    print(f"{'stage':<12}{'seconds':>12}{'peak MB':>12}{'vs last':>10}")
+    for name, result in results.items():
+        change = ''
+        if previous and name in previous['stages'] and previous['stages'][name]['seconds'] > 0:
+            change = f"{result['seconds'] / previous['stages'][name]['seconds']:.2f}x"
+        print(f"{name:<12}{result['seconds']:>12.4f}{result['peak_mb']:>12.2f}{change:>10}")
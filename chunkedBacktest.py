@@ -0,0 +1,285 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import metrics
+from instrumentation import span
+from signalEngine import bollinger_positions
+
+
+def _block_sums(blocks, shift, reverse=False):
+    # Running sums of the deviations from `shift` and of their squares, within each block, from its first
+    # row forward or from its last row backward
+    deviations = blocks - shift
+    if reverse:
+        deviations = deviations[:, ::-1]
+    sums = np.cumsum(deviations, axis=1)
+    squares = np.cumsum(deviations ** 2, axis=1)
+    if reverse:
+        sums, squares = sums[:, ::-1], squares[:, ::-1]
+    shape = (-1,) + blocks.shape[2:]
+    return sums.reshape(shape), squares.reshape(shape), np.broadcast_to(shift, blocks.shape).reshape(shape)
+
+
+def window_moments(values, window, offset=0):
+    # Mean and sample std of every complete window; values[0] is row `offset` of the full series. Rows are cut
+    # into blocks of `window` aligned to the full series, so a window is the end of one block plus the start
+    # of the next. Each part is summed inside its block around one of its own values and the two are merged,
+    # so a window costs O(1) and its statistics depend only on its own values, never on chunk boundaries
+    n_rows = len(values)
+    lead = offset % window
+    n_blocks = -(-(lead + n_rows) // window)
+    padded = np.full((n_blocks * window,) + values.shape[1:], np.nan)
+    padded[lead:lead + n_rows] = values
+    blocks = padded.reshape((n_blocks, window) + values.shape[1:])
+    head_sum, head_squares, head_shift = _block_sums(blocks, blocks[:, :1])
+    tail_sum, tail_squares, tail_shift = _block_sums(blocks, blocks[:, -1:], reverse=True)
+
+    # Window ending at padded row `last` and starting at `first`
+    last = lead + np.arange(window - 1, n_rows)
+    first = last - window + 1
+    head_count = (last % window + 1).reshape((-1,) + (1,) * (values.ndim - 1))
+    tail_count = window - head_count
+    with np.errstate(divide='ignore', invalid='ignore'):
+        head_mean = head_shift[last] + head_sum[last] / head_count
+        head_m2 = head_squares[last] - head_sum[last] ** 2 / head_count
+        tail_mean = tail_shift[first] + tail_sum[first] / tail_count
+        tail_m2 = tail_squares[first] - tail_sum[first] ** 2 / tail_count
+        delta = head_mean - tail_mean
+        whole = tail_count == 0
+        mean = np.where(whole, head_mean, tail_mean + delta * head_count / window)
+        m2 = np.where(whole, head_m2, tail_m2 + head_m2 + delta ** 2 * tail_count * head_count / window)
+    return mean, np.sqrt(np.maximum(m2, 0) / (window - 1))
+
+
+class MonthlyReturns:
+    # Month-end to month-end returns of a value series that arrives a chunk at a time
+    def __init__(self):
+        self.month = None
+        self.base = None
+        self.last = None
+
+    def update(self, dates, values):
+        if not len(values):
+            return []
+        months = dates.astype('datetime64[M]')
+        completed = []
+        if self.base is None:
+            self.base, self.month = values[0], months[0]
+        elif months[0] != self.month:
+            completed.append((self.month, self.last / self.base - 1))
+            self.base = self.last
+
+        for end in np.flatnonzero(months[1:] != months[:-1]):
+            completed.append((months[end], values[end] / self.base - 1))
+            self.base = values[end]
+        self.month, self.last = months[-1], values[-1]
+        return completed
+
+    def close(self):
+        return [(self.month, self.last / self.base - 1)] if self.base is not None else []
+
+
+def _monthly_frame(completed):
+    index = pd.DatetimeIndex([pd.Period(month, 'M').end_time.normalize() for month, _ in completed], name='Date')
+    return pd.DataFrame({'Monthly_Return': [value for _, value in completed]}, index=index)
+
+
+class ChunkedBacktester:
+    # Ratio-mode Bollinger backtest over time-ordered chunks; everything a bar needs from earlier bars is
+    # carried in a few per-pair arrays, so memory is bounded by the chunk size rather than the history
+    def __init__(self, pairs, start_date=None, end_date=None, window=20, store=None, prices=None,
+                 chunk_rows=100_000):
+        self.pairs = [tuple(pair[:2]) for pair in pairs]
+        self.names = [f'{ticker1}-{ticker2}' for ticker1, ticker2 in self.pairs]
+        self.window = window
+        self.start_date = start_date
+        self.end_date = end_date
+        self.chunk_rows = chunk_rows
+        self.prices = prices
+        if prices is None and store is None:
+            from priceStore import PriceStore
+            store = PriceStore(universe='pairs')
+        self.store = store
+
+        self.tickers = list(dict.fromkeys(ticker for pair in self.pairs for ticker in pair))
+        columns = {ticker: j for j, ticker in enumerate(self.tickers)}
+        self.leg1 = np.array([columns[ticker1] for ticker1, _ in self.pairs], dtype=np.int64)
+        self.leg2 = np.array([columns[ticker2] for _, ticker2 in self.pairs], dtype=np.int64)
+
+    def chunks(self):
+        if self.prices is None:
+            yield from self.store.iter_chunks(self.tickers, self.start_date, self.end_date, self.chunk_rows)
+            return
+        dates = self.prices.index.to_numpy(dtype='datetime64[ns]')
+        values = self.prices[self.tickers].to_numpy(dtype=np.float64)
+        for start in range(0, len(values), self.chunk_rows):
+            yield dates[start:start + self.chunk_rows], values[start:start + self.chunk_rows]
+
+    def _reset(self, allocated_capital):
+        n_pairs = len(self.pairs)
+        self.capital = np.broadcast_to(np.asarray(allocated_capital, dtype=np.float64), (n_pairs,))
+        # Per pair: its last window - 1 ratios (oldest first, NaN-padded at the top until it has that many),
+        # the legs' last joint prices and how many bars with both legs it has seen
+        self.ratio_tail = np.full((self.window - 1, n_pairs), np.nan)
+        self.last1 = np.full(n_pairs, np.nan)
+        self.last2 = np.full(n_pairs, np.nan)
+        self.bars_seen = np.zeros(n_pairs, dtype=np.int64)
+        self.position = np.zeros(n_pairs, dtype=np.int64)
+        self.growth = np.ones(n_pairs)
+
+    def _pair_moments(self, ratio):
+        # Rolling moments over each pair's own bars, which continue its tail from earlier chunks; pairs that
+        # have seen the same number of bars share one window_moments call
+        mean = np.full(ratio.shape, np.nan)
+        std = np.full(ratio.shape, np.nan)
+        for seen in np.unique(self.bars_seen):
+            columns = np.flatnonzero(self.bars_seen == seen)
+            carried = min(seen, self.window - 1)
+            history = np.vstack([self.ratio_tail[len(self.ratio_tail) - carried:, columns], ratio[:, columns]])
+            if len(history) < self.window:
+                continue
+            # The window ending at history row h ends at own bar h - carried of this chunk
+            group_mean, group_std = window_moments(history, self.window, seen - carried)
+            first = self.window - 1 - carried
+            mean[first:, columns] = group_mean
+            std[first:, columns] = group_std
+        return mean, std
+
+    def _step(self, prices, entry_sigma, exit_tolerance, cost_model):
+        # Each pair only moves on bars where both of its legs printed, like the in-memory backtester. Those
+        # bars are gathered to the top of the pair's column, in date order, and the rows below are padding
+        ticker1_prices, ticker2_prices = prices[:, self.leg1], prices[:, self.leg2]
+        valid = ~np.isnan(ticker1_prices) & ~np.isnan(ticker2_prices)
+        counts = valid.sum(axis=0)
+        order = None if valid.all() else np.argsort(~valid, axis=0, kind='stable')
+        if order is not None:
+            ticker1_prices = np.take_along_axis(ticker1_prices, order, axis=0)
+            ticker2_prices = np.take_along_axis(ticker2_prices, order, axis=0)
+        own = None if order is None else np.arange(len(prices))[:, None] < counts[None, :]
+        ratio = ticker1_prices / ticker2_prices
+        if own is not None:
+            ratio[~own] = np.nan
+
+        ratio_ma, ratio_sd = self._pair_moments(ratio)
+        tail_rows = counts[None, :] + np.arange(self.window - 1)[:, None]
+        self.ratio_tail = np.take_along_axis(np.vstack([self.ratio_tail, ratio]), tail_rows, axis=0)
+        upper_band = ratio_ma + entry_sigma * ratio_sd
+        lower_band = ratio_ma - entry_sigma * ratio_sd
+
+        # Each pair stays flat for its first `window` bars, as in the single-pair backtest
+        warm_up = (self.bars_seen[None, :] + np.arange(len(ratio))[:, None]) < self.window
+        ratio_ma = np.where(warm_up, np.nan, ratio_ma)
+        upper_band = np.where(warm_up, np.nan, upper_band)
+        lower_band = np.where(warm_up, np.nan, lower_band)
+        positions = bollinger_positions(ratio, ratio_ma, upper_band, lower_band, 0, exit_tolerance,
+                                        initial=self.position)
+
+        # Returns run from a pair's previous bar, possibly in an earlier chunk, to this one
+        held = np.vstack([self.position, positions])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ticker1_returns = ticker1_prices / np.vstack([self.last1, ticker1_prices[:-1]]) - 1
+            ticker2_returns = ticker2_prices / np.vstack([self.last2, ticker2_prices[:-1]]) - 1
+        ticker1_returns[~np.isfinite(ticker1_returns)] = 0
+        ticker2_returns[~np.isfinite(ticker2_returns)] = 0
+        returns = held[:-1] * (ticker1_returns - ticker2_returns)
+        if cost_model is not None:
+            ticker1s, ticker2s = zip(*self.pairs)
+            returns = returns - cost_model.costs(held, ticker1s, ticker2s)[1:]
+
+        last = np.maximum(counts - 1, 0)[None, :]
+        started = counts > 0
+        self.position = np.where(started, np.take_along_axis(positions, last, axis=0)[0], self.position)
+        self.last1 = np.where(started, np.take_along_axis(ticker1_prices, last, axis=0)[0], self.last1)
+        self.last2 = np.where(started, np.take_along_axis(ticker2_prices, last, axis=0)[0], self.last2)
+        self.bars_seen += counts
+        if order is not None:
+            # Back onto the chunk's dates: a pair earns its return on its own bars and nothing in between
+            rank = np.maximum(np.cumsum(valid, axis=0) - 1, 0)
+            returns = np.where(valid, np.take_along_axis(np.where(own, returns, 0), rank, axis=0), 0)
+
+        growth = np.cumprod(np.vstack([self.growth, 1 + returns]), axis=0)[1:]
+        self.growth = growth[-1]
+        return self.capital * growth
+
+    def run(self, allocated_capital, entry_sigma=2, exit_tolerance=.01, cost_model=None, output_dir=None):
+        self._reset(allocated_capital)
+        monthly = MonthlyReturns()
+        completed = []
+        paths = {}
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            paths = {name: os.path.join(output_dir, f'{name}.csv') for name in ['equity', 'monthly_returns']}
+            for path in paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
+
+        for dates, prices in self.chunks():
+            with span('backtest_chunk', rows=len(dates), pairs=len(self.pairs)):
+                # Rows where none of the tickers traded are left out of the output, as PortfolioBacktester
+                # leaves them out of its index
+                traded = ~np.isnan(prices).all(axis=1)
+                dates, prices = dates[traded], prices[traded]
+                if not len(dates):
+                    continue
+                equity = self._step(prices, entry_sigma, exit_tolerance, cost_model)
+                # Summed pair by pair; numpy's own row reduction can change order with the chunk's shape
+                total = np.zeros(len(equity))
+                for column in equity.T:
+                    total += column
+                months = monthly.update(dates, total)
+                completed += months
+
+                if paths:
+                    frame = pd.DataFrame(equity, index=pd.DatetimeIndex(dates, name='Date'), columns=self.names)
+                    frame['Total_Portfolio_Value'] = total
+                    frame.to_csv(paths['equity'], mode='a', header=not os.path.exists(paths['equity']))
+                    if months:
+                        _monthly_frame(months).to_csv(paths['monthly_returns'], mode='a',
+                                                      header=not os.path.exists(paths['monthly_returns']))
+
+        months = monthly.close()
+        completed += months
+        if paths and months:
+            _monthly_frame(months).to_csv(paths['monthly_returns'], mode='a',
+                                          header=not os.path.exists(paths['monthly_returns']))
+        self.final_equity = pd.Series(self.capital * self.growth, index=self.names)
+        return _monthly_frame(completed)['Monthly_Return']
+
+
+def synthetic_minute_prices(n_tickers, n_days, bars_per_day=390, seed=0):
+    # A regular-session minute grid on business days; gaps between sessions are left out
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range('2020-01-01', periods=n_days)
+    minutes = pd.timedelta_range('09:30:00', periods=bars_per_day, freq='min')
+    index = pd.DatetimeIndex((days.values[:, None] + minutes.values[None, :]).ravel(), name='Date')
+    log_prices = np.cumsum(rng.normal(0, .0005, (len(index), n_tickers)), axis=0)
+    return pd.DataFrame(100 * np.exp(log_prices), index=index, columns=[f'T{j}' for j in range(n_tickers)])
+
+
+if __name__ == "__main__":
+    from portfolioBacktest import PortfolioBacktester
+
+    window = 390
+    prices = synthetic_minute_prices(20, 250, seed=0)
+    pairs = [(f'T{2 * k}', f'T{2 * k + 1}') for k in range(10)]
+
+    single = ChunkedBacktester(pairs, window=window, prices=prices, chunk_rows=len(prices))
+    single_monthly = single.run(1000.0, output_dir='chunked_output/single')
+    single_equity = pd.read_csv('chunked_output/single/equity.csv', index_col=0)
+
+    for chunk_rows in [1_000, 25_000]:
+        start = time.perf_counter()
+        chunked = ChunkedBacktester(pairs, window=window, prices=prices, chunk_rows=chunk_rows)
+        chunked_monthly = chunked.run(1000.0, output_dir=f'chunked_output/{chunk_rows}')
+        elapsed = time.perf_counter() - start
+        chunked_equity = pd.read_csv(f'chunked_output/{chunk_rows}/equity.csv', index_col=0)
+        if not (chunked_equity.equals(single_equity) and chunked_monthly.equals(single_monthly)):
+            raise AssertionError(f"Chunked results differ from the single pass at {chunk_rows} rows per chunk")
+        print(f"{len(prices)} bars in chunks of {chunk_rows:>6}: {elapsed:.2f} s, identical to the single pass")
+
+    # The in-memory backtester uses pandas rolling windows, so agreement there is to rounding only
+    in_memory = PortfolioBacktester(pairs, window=window, prices=prices).run(1000.0)
+    print(f"max relative difference from PortfolioBacktester: "
+          f"{np.max(np.abs(single_equity[single.names].to_numpy() / in_memory.to_numpy() - 1)):.1e}")
+    print(metrics.metrics_table(single_monthly, periods_per_year=metrics.MONTHS))
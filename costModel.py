@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from metrics import TRADING_DAYS
+
+
+class CostModel:
+    # All rates are fractions of the capital behind one pair; each leg carries that capital at |position| = 1
+    def __init__(self, commission_bps=1.0, slippage_bps=2.0, borrow_rate=0.005, roll_cost_bps=5.0,
+                 rolls_per_year=12, periods_per_year=TRADING_DAYS, futures_suffix='=F'):
+        self.commission_bps = commission_bps
+        self.slippage_bps = slippage_bps
+        self.borrow_rate = borrow_rate
+        self.roll_cost_bps = roll_cost_bps
+        self.rolls_per_year = rolls_per_year
+        self.periods_per_year = periods_per_year
+        self.futures_suffix = futures_suffix
+
+    def is_future(self, ticker):
+        return ticker.endswith(self.futures_suffix)
+
+    def slippage(self, ticker):
+        if isinstance(self.slippage_bps, dict):
+            return self.slippage_bps.get(ticker, self.slippage_bps.get('default', 0.0))
+        return self.slippage_bps
+
+    def _leg_rates(self, tickers):
+        futures = np.array([self.is_future(ticker) for ticker in tickers])
+        trade = np.array([self.commission_bps + self.slippage(ticker) for ticker in tickers]) / 1e4
+        # Futures legs pay roll costs instead of a borrow fee when short
+        borrow = np.where(futures, 0.0, self.borrow_rate / self.periods_per_year)
+        roll = np.where(futures, self.roll_cost_bps / 1e4 * self.rolls_per_year / self.periods_per_year, 0.0)
+        return trade, borrow, roll
+
+    def costs(self, positions, ticker1s, ticker2s):
+        positions = np.asarray(positions, dtype=np.float64)
+        squeeze = positions.ndim == 1
+        positions = positions[:, None] if squeeze else positions
+        trade1, borrow1, roll1 = self._leg_rates(ticker1s)
+        trade2, borrow2, roll2 = self._leg_rates(ticker2s)
+
+        # Both legs trade |change in position| on the bar the signal flips
+        turnover = np.abs(np.diff(positions, axis=0, prepend=0))
+        trading = turnover * (trade1 + trade2)
+
+        # Holding costs accrue on the bar after the position was set, like Strategy_Return
+        held = np.zeros_like(positions)
+        held[1:] = positions[:-1]
+        borrow = np.where(held < 0, borrow1, 0.0) + np.where(held > 0, borrow2, 0.0)
+        holding = (borrow + roll1 + roll2) * np.abs(held)
+
+        total = trading + holding
+        return total[:, 0] if squeeze else total
+
+    def report(self, positions, costs, names=None):
+        positions = np.asarray(positions, dtype=np.float64)
+        costs = np.asarray(costs, dtype=np.float64)
+        if positions.ndim == 1:
+            positions, costs = positions[:, None], costs[:, None]
+        years = len(positions) / self.periods_per_year
+        # Column-major so each pair's sum is the same whichever block of pairs it was computed with
+        costs = np.asfortranarray(costs)
+        turnover = 2 * np.abs(np.diff(positions, axis=0, prepend=0)).sum(axis=0)
+        return pd.DataFrame({'Annual_Turnover': turnover / years,
+                             'Cost_Drag': costs.sum(axis=0) / years}, index=names)
@@ -0,0 +1,136 @@
+import atexit
+import functools
+import json
+import os
+import time
+from collections import defaultdict
+
+_state = {'enabled': False, 'records': []}
+
+
+class _NullSpan:
+    # Shared do-nothing span handed out while instrumentation is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, stage, fields):
+        self.record = {'stage': stage, 'rows': None, 'counts': {}, **fields}
+
+    def __enter__(self):
+        self.record['start'] = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.record['seconds'] = time.perf_counter() - self._start
+        self.record['error'] = exc_type.__name__ if exc_type else None
+        _state['records'].append(self.record)
+        return False
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def count(self, name, n=1):
+        self.record['counts'][name] = self.record['counts'].get(name, 0) + n
+
+
+def span(stage, **fields):
+    if not _state['enabled']:
+        return _NULL_SPAN
+    return Span(stage, fields)
+
+
+def instrumented(stage=None, rows=None):
+    def decorator(func):
+        name = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return func(*args, **kwargs)
+            with Span(name, {}) as current:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    current.set(rows=rows(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def enable():
+    _state['enabled'] = True
+
+
+def disable():
+    _state['enabled'] = False
+
+
+def records():
+    return list(_state['records'])
+
+
+def clear():
+    _state['records'].clear()
+
+
+def export_jsonl(path):
+    with open(path, 'a') as f:
+        for record in _state['records']:
+            f.write(json.dumps(record, default=str) + '\n')
+
+
+def export_prometheus(path):
+    seconds = defaultdict(float)
+    calls = defaultdict(int)
+    rows = defaultdict(int)
+    counts = defaultdict(int)
+    for record in _state['records']:
+        stage = record['stage']
+        seconds[stage] += record['seconds']
+        calls[stage] += 1
+        rows[stage] += record['rows'] or 0
+        for name, value in record['counts'].items():
+            counts[(stage, name)] += value
+
+    lines = ['# TYPE pairs_stage_seconds_total counter']
+    lines += [f'pairs_stage_seconds_total{{stage="{stage}"}} {value:.6f}' for stage, value in seconds.items()]
+    lines += ['# TYPE pairs_stage_calls_total counter']
+    lines += [f'pairs_stage_calls_total{{stage="{stage}"}} {value}' for stage, value in calls.items()]
+    lines += ['# TYPE pairs_stage_rows_total counter']
+    lines += [f'pairs_stage_rows_total{{stage="{stage}"}} {value}' for stage, value in rows.items()]
+    lines += ['# TYPE pairs_stage_events_total counter']
+    lines += [f'pairs_stage_events_total{{stage="{stage}",event="{name}"}} {value}'
+              for (stage, name), value in counts.items()]
+
+    # Write then rename so a node exporter textfile collector never reads a partial file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+
+def _export_at_exit():
+    if os.environ.get('PAIRS_TRACE_JSONL'):
+        export_jsonl(os.environ['PAIRS_TRACE_JSONL'])
+    if os.environ.get('PAIRS_TRACE_PROM'):
+        export_prometheus(os.environ['PAIRS_TRACE_PROM'])
+
+
+# Setting either variable turns tracing on for a run without touching the scripts
+if os.environ.get('PAIRS_TRACE_JSONL') or os.environ.get('PAIRS_TRACE_PROM'):
+    enable()
+    atexit.register(_export_at_exit)
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+MONTHS = 12
+
+
+def _as_matrix(returns):
+    values = np.asarray(returns, dtype=np.float64)
+    return values[:, None] if values.ndim == 1 else values
+
+
+def _names(returns, n):
+    if isinstance(returns, pd.DataFrame):
+        return returns.columns
+    if isinstance(returns, pd.Series):
+        return [returns.name if returns.name is not None else 'Returns']
+    return range(n)
+
+
+def _squeeze(values, returns):
+    return values[0] if np.ndim(returns) == 1 else values
+
+
+def _nanstd(values, ddof=0):
+    count = np.count_nonzero(~np.isnan(values), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.nansum(values, axis=0) / count
+        return np.sqrt(np.nansum((values - mean) ** 2, axis=0) / (count - ddof))
+
+
+def _window_sums(values, window):
+    # Trailing sums over up to `window` rows for every row, the first rows summing the partial windows
+    sums = np.cumsum(np.concatenate([np.zeros((1,) + values.shape[1:]), values]), axis=0)
+    starts = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+    return sums[1:] - sums[starts]
+
+
+def rolling_moments(values, window, min_periods=None):
+    # Rolling mean and sample std from cumulative sums, centered first to limit cancellation. NaNs are kept
+    # out of the sums and each window divides by its own count; as in pandas, a window needs min_periods
+    # observations (all of them by default)
+    values = np.asarray(values, dtype=np.float64)
+    min_periods = window if min_periods is None else max(min_periods, 1)
+    valid = ~np.isnan(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shift = np.nan_to_num(np.nansum(values, axis=0) / valid.sum(axis=0))
+    centered = np.where(valid, values - shift, 0)
+    window_sum = _window_sums(centered, window)
+    window_squares = _window_sums(centered ** 2, window)
+    count = _window_sums(valid, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count >= min_periods, window_sum / count + shift, np.nan)
+        variance = (window_squares - window_sum ** 2 / count) / (count - 1)
+        std = np.where((count >= min_periods) & (count > 1), np.sqrt(np.maximum(variance, 0)), np.nan)
+    return mean, std
+
+
+def cagr(returns, periods_per_year=TRADING_DAYS, years=None):
+    values = _as_matrix(returns)
+    growth = np.nanprod(1 + values, axis=0)
+    if years is None:
+        years = np.count_nonzero(~np.isnan(values), axis=0) / periods_per_year
+    return _squeeze(growth ** (1 / years) - 1, returns)
+
+
+def annualized_volatility(returns, periods_per_year=TRADING_DAYS):
+    values = _as_matrix(returns)
+    return _squeeze(_nanstd(values, ddof=1) * np.sqrt(periods_per_year), returns)
+
+
+def _annual_excess(values, risk_free_rate, periods_per_year, annual_return):
+    # The arithmetic annualized mean unless the caller supplies its own annual return, e.g. the CAGR
+    if annual_return is None:
+        annual_return = np.nanmean(values, axis=0) * periods_per_year
+    return np.asarray(annual_return, dtype=np.float64) - risk_free_rate
+
+
+def sharpe_ratio(returns, risk_free_rate=0.02, periods_per_year=TRADING_DAYS, annual_return=None):
+    values = _as_matrix(returns)
+    excess = _annual_excess(values, risk_free_rate, periods_per_year, annual_return)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _squeeze(excess / (_nanstd(values, ddof=1) * np.sqrt(periods_per_year)), returns)
+
+
+def sortino_ratio(returns, risk_free_rate=0.02, periods_per_year=TRADING_DAYS, annual_return=None, ddof=0):
+    values = _as_matrix(returns)
+    excess = _annual_excess(values, risk_free_rate, periods_per_year, annual_return)
+    # Downside deviation is the std of the negative returns only, by default the population std
+    downside = np.where(values < 0, values, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        downside_deviation = _nanstd(downside, ddof) * np.sqrt(periods_per_year)
+        return _squeeze(excess / downside_deviation, returns)
+
+
+def drawdowns(returns):
+    equity = np.cumprod(1 + np.nan_to_num(_as_matrix(returns)), axis=0)
+    return equity / np.maximum.accumulate(equity, axis=0) - 1
+
+
+def max_drawdown(returns):
+    return _squeeze(drawdowns(returns).min(axis=0), returns)
+
+
+def skewness(returns):
+    # Biased sample skew, the scipy.stats.skew default
+    values = _as_matrix(returns)
+    deviations = values - np.nanmean(values, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _squeeze(np.nanmean(deviations ** 3, axis=0) / np.nanmean(deviations ** 2, axis=0) ** 1.5, returns)
+
+
+def compute_metrics(returns, risk_free_rate=0.02, periods_per_year=TRADING_DAYS):
+    values = _as_matrix(returns)
+    return {
+        'Annualized_Return': np.nanmean(values, axis=0) * periods_per_year,
+        'CAGR': cagr(values, periods_per_year),
+        'Volatility': annualized_volatility(values, periods_per_year),
+        'Sharpe_Ratio': sharpe_ratio(values, risk_free_rate, periods_per_year),
+        'Sortino_Ratio': sortino_ratio(values, risk_free_rate, periods_per_year),
+        'Max_Drawdown': max_drawdown(values),
+        'Skew': skewness(values),
+    }
+
+
+def metrics_table(returns, risk_free_rate=0.02, periods_per_year=TRADING_DAYS):
+    values = _as_matrix(returns)
+    return pd.DataFrame(compute_metrics(values, risk_free_rate, periods_per_year),
+                        index=_names(returns, values.shape[1]))
+
+
+def _rolling_frame(values, returns):
+    if isinstance(returns, pd.Series):
+        return pd.Series(values[:, 0], index=returns.index, name=returns.name)
+    if isinstance(returns, pd.DataFrame):
+        return pd.DataFrame(values, index=returns.index, columns=returns.columns)
+    return values[:, 0] if np.ndim(returns) == 1 else values
+
+
+def rolling_volatility(returns, window, periods_per_year=TRADING_DAYS, min_periods=None):
+    _, std = rolling_moments(_as_matrix(returns), window, min_periods)
+    return _rolling_frame(std * np.sqrt(periods_per_year), returns)
+
+
+def rolling_sharpe(returns, window, risk_free_rate=0.02, periods_per_year=TRADING_DAYS, min_periods=None):
+    mean, std = rolling_moments(_as_matrix(returns), window, min_periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = (mean * periods_per_year - risk_free_rate) / (std * np.sqrt(periods_per_year))
+    return _rolling_frame(sharpe, returns)
+
+
+def rolling_cagr(returns, window, periods_per_year=TRADING_DAYS, min_periods=None):
+    # Annualized over the observations each window actually has, with the same NaN rule as rolling_moments
+    min_periods = window if min_periods is None else max(min_periods, 1)
+    log_growth = np.log1p(_as_matrix(returns))
+    valid = ~np.isnan(log_growth)
+    count = _window_sums(valid, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(count >= min_periods,
+                          np.expm1(_window_sums(np.where(valid, log_growth, 0), window) * periods_per_year / count),
+                          np.nan)
+    return _rolling_frame(growth, returns)
+
+
+def rolling_max_drawdown(returns, window, chunk_size=256):
+    equity = np.cumprod(1 + np.nan_to_num(_as_matrix(returns)), axis=0)
+    result = np.full(equity.shape, np.nan)
+    if len(equity) >= window:
+        # Worst peak-to-trough inside each trailing window, a block of windows at a time to bound memory
+        windows = np.lib.stride_tricks.sliding_window_view(equity, window, axis=0)
+        for start in range(0, len(windows), chunk_size):
+            block = windows[start:start + chunk_size]
+            worst = (block / np.maximum.accumulate(block, axis=-1) - 1).min(axis=-1)
+            result[window - 1 + start:window - 1 + start + len(block)] = worst
+    return _rolling_frame(result, returns)
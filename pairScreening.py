@@ -0,0 +1,183 @@
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+import numpy as np
+from instrumentation import span
+from resultCache import fingerprint
+
+_shared = {}
+
+
+def _attach_prices(name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    _shared['shm'] = shm
+    _shared['prices'] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf, order='F')
+
+
+def adf_pvalues(prices, columns):
+    # statsmodels is slow to import, so it is loaded on first use rather than with the module
+    from statsmodels.tsa.stattools import adfuller
+
+    return [adfuller(prices[:, j])[1] for j in columns]
+
+
+def coint_accepts(prices, pairs, threshold, method='statsmodels', lags=1):
+    if method == 'engle_granger':
+        from engleGranger import cointegrated
+
+        return list(cointegrated(prices, pairs, threshold, lags))
+    from statsmodels.tsa.stattools import coint
+
+    return [coint(prices[:, i], prices[:, j])[1] < threshold for i, j in pairs]
+
+
+def _adf_task(columns):
+    return adf_pvalues(_shared['prices'], columns)
+
+
+def _coint_task(pairs, threshold, method, lags):
+    return coint_accepts(_shared['prices'], pairs, threshold, method, lags)
+
+
+def _chunks(items, chunk_size):
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
+
+
+class PairScreener:
+    def __init__(self, data, adf_threshold=0.05, coint_threshold=0.05, max_workers=None, chunk_size=16,
+                 coint_method='statsmodels', coint_lags=1, cache=None):
+        self.columns = {ticker: j for j, ticker in enumerate(data.columns)}
+        self.adf_threshold = adf_threshold
+        self.coint_threshold = coint_threshold
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.coint_method = coint_method
+        self.coint_lags = coint_lags
+        self.adf_cache = {}
+        # Optional ResultCache that keeps ADF p-values and cointegration verdicts across runs
+        self.cache = cache
+        self.prices = np.asfortranarray(data.to_numpy(dtype=np.float64))
+        self._shm = None
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def _pool(self):
+        if self._executor is None:
+            # Prices are copied into shared memory once; tasks only carry column indices
+            self._shm = shared_memory.SharedMemory(create=True, size=max(self.prices.nbytes, 1))
+            shared = np.ndarray(self.prices.shape, dtype=np.float64, buffer=self._shm.buf, order='F')
+            shared[:] = self.prices
+            self._executor = ProcessPoolExecutor(self.max_workers, initializer=_attach_prices,
+                                                 initargs=(self._shm.name, self.prices.shape))
+        return self._executor
+
+    def _map_in_order(self, task, local, chunks):
+        if self.max_workers == 1:
+            for chunk in chunks:
+                yield chunk, local(self.prices, chunk)
+            return
+
+        executor = self._pool()
+        in_flight = deque()
+        window = 2 * (self.max_workers or os.cpu_count() or 1)
+        try:
+            for chunk in chunks:
+                in_flight.append((chunk, executor.submit(task, chunk)))
+                if len(in_flight) >= window:
+                    chunk, future = in_flight.popleft()
+                    yield chunk, future.result()
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                yield chunk, future.result()
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def adf_pvalue(self, tickers):
+        missing = sorted({self.columns[ticker] for ticker in tickers if ticker not in self.adf_cache})
+        names = list(self.columns)
+        keys = {}
+        if self.cache is not None:
+            keys = {j: fingerprint('adf_pvalue/1', self.prices[:, j]) for j in missing}
+            stored = {j: self.cache.get(key) for j, key in keys.items()}
+            self.adf_cache.update({names[j]: p_value for j, p_value in stored.items() if p_value is not None})
+            missing = [j for j in missing if stored[j] is None]
+        for chunk, pvalues in self._map_in_order(_adf_task, adf_pvalues, list(_chunks(missing, self.chunk_size))):
+            for j, p_value in zip(chunk, pvalues):
+                self.adf_cache[names[j]] = p_value
+                if self.cache is not None:
+                    self.cache.put(keys[j], p_value)
+        return {ticker: self.adf_cache[ticker] for ticker in tickers}
+
+    def is_non_stationary(self, ticker):
+        return self.adf_pvalue([ticker])[ticker] >= self.adf_threshold
+
+    def screen(self, top_pairs, max_pairs=20):
+        with span('screen_pairs', coint_method=self.coint_method) as current:
+            top_pairs = list(top_pairs)
+            best_pairs = self._screen(top_pairs, max_pairs, current)
+            current.set(rows=len(top_pairs))
+            current.count('accepted', len(best_pairs))
+            return best_pairs
+
+    def _screen(self, top_pairs, max_pairs, current):
+        self.adf_pvalue({ticker for ticker1, ticker2, _ in top_pairs for ticker in (ticker1, ticker2)})
+        candidates = [(ticker1, ticker2, corr) for ticker1, ticker2, corr in top_pairs
+                      if self.is_non_stationary(ticker1) and self.is_non_stationary(ticker2)]
+        current.count('rejected_adf', len(top_pairs) - len(candidates))
+
+        best_pairs = []
+        indices = [(self.columns[t1], self.columns[t2]) for t1, t2, _ in candidates]
+        options = dict(threshold=self.coint_threshold, method=self.coint_method, lags=self.coint_lags)
+        keys = [None] * len(indices)
+        stored = [None] * len(indices)
+        if self.cache is not None:
+            keys = [fingerprint('coint_accept/1', self.prices[:, i], self.prices[:, j], options) for i, j in indices]
+            stored = [self.cache.get(key) for key in keys]
+
+        # Only pairs without a stored verdict go to the workers
+        pending = [pair for pair, accepted in zip(indices, stored) if accepted is None]
+        results = self._map_in_order(partial(_coint_task, **options), partial(coint_accepts, **options),
+                                     _chunks(pending, self.chunk_size))
+        computed = (accepted for _, accepts in results for accepted in accepts)
+        try:
+            # Results arrive in correlation order, so stopping early keeps the serial semantics
+            for pair, key, accepted in zip(candidates, keys, stored):
+                if accepted is None:
+                    accepted = bool(next(computed))
+                    if self.cache is not None:
+                        self.cache.put(key, accepted)
+                current.count('coint_tested')
+                if accepted:
+                    best_pairs.append(pair)
+                else:
+                    current.count('rejected_coint')
+                if len(best_pairs) >= max_pairs:
+                    return best_pairs
+        finally:
+            results.close()
+        return best_pairs
+
+
+def screen_pairs(data, top_pairs, adf_threshold=0.05, coint_threshold=0.05, max_pairs=20, max_workers=None,
+                 coint_method='statsmodels', cache=None):
+    with PairScreener(data, adf_threshold, coint_threshold, max_workers, coint_method=coint_method,
+                      cache=cache) as screener:
+        return screener.screen(top_pairs, max_pairs)
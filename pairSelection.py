@@ -0,0 +1,71 @@
+import heapq
+import numpy as np
+
+
+def _order_by_strength(values):
+    # Strongest absolute correlation first; ties keep (i, j) order like a stable sort would
+    strength = np.abs(values)
+    strength = np.where(np.isnan(strength), -np.inf, strength)
+    return np.lexsort((np.arange(len(values)), -strength))
+
+
+def top_pairs(correlation_matrix, top_n=20):
+    if top_n <= 0:
+        return []
+    columns = correlation_matrix.columns
+    matrix = correlation_matrix.to_numpy()
+    rows, cols = np.triu_indices(len(columns), k=1)
+    values = matrix[rows, cols]
+
+    if top_n < len(values):
+        strength = np.abs(values)
+        strength = np.where(np.isnan(strength), -np.inf, strength)
+        candidates = np.argpartition(-strength, top_n - 1)[:top_n]
+        # Widen the cut to every pair tied with the weakest kept one so tie order stays stable
+        cutoff = strength[candidates].min()
+        candidates = np.flatnonzero(strength >= cutoff)
+    else:
+        candidates = np.arange(len(values))
+
+    candidates = np.sort(candidates)
+    order = candidates[_order_by_strength(values[candidates])][:top_n]
+    return [(columns[rows[k]], columns[cols[k]], values[k]) for k in order]
+
+
+def blocked_top_pairs(data, top_n=20, block_size=512):
+    if top_n <= 0:
+        return []
+    columns = data.columns
+    prices = data.to_numpy(dtype=np.float32)
+    prices = prices - prices.mean(axis=0)
+    norms = np.sqrt(np.einsum('ij,ij->j', prices, prices))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prices /= norms
+
+    # Min-heap of the strongest pairs seen so far, keyed on (|corr|, -i, -j) to mirror top_pairs ordering
+    heap = []
+    n = prices.shape[1]
+    for start_i in range(0, n, block_size):
+        block_i = prices[:, start_i:start_i + block_size]
+        for start_j in range(start_i, n, block_size):
+            block_j = prices[:, start_j:start_j + block_size]
+            tile = block_i.T @ block_j
+
+            rows, cols = np.indices(tile.shape).reshape(2, -1)
+            keep = start_i + rows < start_j + cols
+            rows, cols = rows[keep], cols[keep]
+            values = tile[rows, cols]
+            strength = np.nan_to_num(np.abs(values), nan=-np.inf)
+
+            if len(values) > top_n:
+                keep = np.argpartition(-strength, top_n - 1)[:top_n]
+                rows, cols, values, strength = rows[keep], cols[keep], values[keep], strength[keep]
+
+            for k in range(len(values)):
+                item = (float(strength[k]), -(start_i + int(rows[k])), -(start_j + int(cols[k])), float(values[k]))
+                if len(heap) < top_n:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+    return [(columns[-i], columns[-j], value) for _, i, j, value in sorted(heap, reverse=True)]
@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import itertools
+import time
+import numpy as np
+import pandas as pd
+from metrics import compute_metrics, rolling_moments
+from signalEngine import bollinger_positions
+
+
+def evaluate_window(ratio, spread_returns, window, entry_sigmas, exit_tolerances, cost_model=None, legs=None):
+    ratio_ma, ratio_sd = rolling_moments(ratio, window)
+    sigmas = np.asarray(entry_sigmas, dtype=np.float64)
+    # Every sigma shares the same rolling statistics: bands are (T x n_sigmas) broadcasts
+    upper_band = ratio_ma[:, None] + sigmas[None, :] * ratio_sd[:, None]
+    lower_band = ratio_ma[:, None] - sigmas[None, :] * ratio_sd[:, None]
+    ratios = np.broadcast_to(ratio[:, None], upper_band.shape)
+    means = np.broadcast_to(ratio_ma[:, None], upper_band.shape)
+
+    rows = []
+    for exit_tolerance in exit_tolerances:
+        positions = bollinger_positions(ratios, means, upper_band, lower_band, window, exit_tolerance)
+        returns = np.zeros(positions.shape)
+        returns[1:] = positions[:-1] * spread_returns[1:, None]
+        if cost_model is not None:
+            costs = cost_model.costs(positions, [legs[0]] * len(sigmas), [legs[1]] * len(sigmas))
+            returns -= costs
+            cost_report = cost_model.report(positions, costs)
+        metrics = {'Total_Return': np.prod(1 + returns, axis=0) - 1, **compute_metrics(returns)}
+        if cost_model is not None:
+            metrics.update({name: cost_report[name].to_numpy() for name in cost_report.columns})
+        trades = np.count_nonzero(np.diff(positions, axis=0), axis=0)
+        for k, entry_sigma in enumerate(sigmas):
+            rows.append({'Window': window, 'Entry_Sigma': entry_sigma, 'Exit_Tolerance': exit_tolerance,
+                         **{name: values[k] for name, values in metrics.items()}, 'Trades': trades[k]})
+    return rows
+
+
+def sweep(data, ticker1, ticker2, windows, entry_sigmas=(2,), exit_tolerances=(.01,), max_workers=None,
+          cost_model=None):
+    data = data[[ticker1, ticker2]].dropna()
+    prices = data.to_numpy(dtype=np.float64)
+    ratio = prices[:, 0] / prices[:, 1]
+    leg_returns = np.zeros_like(prices)
+    leg_returns[1:] = prices[1:] / prices[:-1] - 1
+    spread_returns = leg_returns[:, 0] - leg_returns[:, 1]
+
+    evaluate = partial(evaluate_window, ratio, spread_returns,
+                       entry_sigmas=list(entry_sigmas), exit_tolerances=list(exit_tolerances),
+                       cost_model=cost_model, legs=(ticker1, ticker2))
+    if max_workers == 1:
+        results = map(evaluate, windows)
+    else:
+        with ProcessPoolExecutor(max_workers) as executor:
+            results = list(executor.map(evaluate, windows))
+    return pd.DataFrame(list(itertools.chain.from_iterable(results)))
+
+
+if __name__ == "__main__":
+    from portfolioBacktest import synthetic_prices
+
+    prices = synthetic_prices(2, 2520)
+    windows = range(10, 110, 10)
+    entry_sigmas = np.linspace(1, 3, 10)
+    exit_tolerances = np.linspace(.001, .05, 10)
+
+    start = time.perf_counter()
+    results = sweep(prices, 'T0', 'T1', windows, entry_sigmas, exit_tolerances)
+    elapsed = time.perf_counter() - start
+    print(f"{len(results)} combinations in {elapsed:.2f} s")
+    print(results.sort_values('Sharpe_Ratio', ascending=False).head(10).to_string(index=False))
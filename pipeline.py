@@ -0,0 +1,296 @@
+import argparse
+import copy
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from graphlib import TopologicalSorter
+import numpy as np
+import pandas as pd
+import metrics
+from instrumentation import span
+from resultCache import ResultCache, fingerprint
+
+# Heavy dependencies (statsmodels, yfinance, matplotlib, seaborn) are only imported by the stages that
+# need them, so loading a config or reading cached results stays fast
+
+DEFAULTS = {
+    'name': 'pairs',
+    # source is 'tickers' (the list below, or the backtest pairs when empty), 'sp500' or 'etfs'. Prices come
+    # from provider.name: 'yfinance', 'csv' (location is a directory of per-symbol CSVs), 'http' (location is
+    # a URL template for HTTPCSVProvider) or None to read only what the store already holds
+    'universe': {'source': 'tickers', 'tickers': [], 'store': 'pairs', 'root': 'price_store',
+                 'provider': {'name': 'yfinance', 'location': None, 'max_concurrency': 8, 'rate': 5}},
+    # dropna='columns' drops tickers with gaps in the window, 'rows' drops the dates instead
+    'formation': {'start': '2011-01-01', 'end': '2014-01-01', 'top_n': 20, 'dropna': 'columns'},
+    'screening': {'adf_threshold': 0.05, 'coint_threshold': 0.05, 'max_pairs': 20,
+                  'coint_method': 'statsmodels', 'max_workers': None},
+    # Listing pairs here skips the formation window and screening
+    'backtest': {'start': '2014-01-01', 'end': '2024-11-01', 'pairs': [], 'window': 20, 'entry_sigma': 2,
+                 'exit_tolerance': 0.01, 'hedge': None, 'hedge_window': 60, 'compact': False, 'costs': None},
+    # sleeves are extra tickers (e.g. an ETF) held alongside the pairs
+    'allocation': {'capital': 1_000_000.0, 'sleeves': [], 'scheme': 'equal', 'rebalance': 'monthly',
+                   'threshold': 0.05, 'lookback': 60, 'weights': None, 'kelly_fraction': 0.5,
+                   'kelly_cap': 0.25, 'cost_bps': 0.0},
+    'metrics': {'risk_free_rate': 0.02},
+    'output': {'directory': None, 'cache': 'result_cache'},
+}
+
+
+def _merge(defaults, overrides):
+    merged = copy.deepcopy(defaults)
+    for key, value in overrides.items():
+        if key not in defaults:
+            raise ValueError(f"Unknown config key: {key}")
+        merged[key] = _merge(defaults[key], value) if isinstance(defaults[key], dict) else value
+    return merged
+
+
+def load_config(source):
+    # A path to a .toml, .yaml or .yml file, or a dict already in memory
+    if isinstance(source, dict):
+        config = _merge(DEFAULTS, source)
+    elif source.endswith('.toml'):
+        import tomllib
+
+        with open(source, 'rb') as f:
+            config = _merge(DEFAULTS, tomllib.load(f))
+    elif source.endswith(('.yaml', '.yml')):
+        import yaml
+
+        with open(source) as f:
+            config = _merge(DEFAULTS, yaml.safe_load(f) or {})
+    else:
+        raise ValueError(f"Unsupported config format: {source}")
+    # TOML and YAML both parse bare dates into date objects; the stages expect strings
+    for section in ('formation', 'backtest'):
+        for key in ('start', 'end'):
+            config[section][key] = str(config[section][key])
+    return config
+
+
+def _pairs(config):
+    return [tuple(pair[:2]) for pair in config['backtest']['pairs']]
+
+
+def universe_tickers(config):
+    source = config['universe']['source']
+    if source == 'tickers':
+        tickers = config['universe']['tickers'] or [ticker for pair in _pairs(config) for ticker in pair]
+    elif source == 'sp500':
+        tickers = pd.read_html('https://en.wikipedia.org/wiki/List_of_S%26P_500_companies')[0]['Symbol'].tolist()
+    elif source == 'etfs':
+        from etfPairs import ETFS
+
+        tickers = list(ETFS.values())
+    else:
+        raise ValueError(f"Unknown universe source: {source}")
+    return list(tickers)
+
+
+def price_provider(settings):
+    from asyncFetcher import AsyncFetcher
+    from priceStore import CSVProvider, HTTPCSVProvider, YFinanceProvider
+
+    name = settings['name']
+    if name is None:
+        return None
+    if name == 'yfinance':
+        provider = YFinanceProvider()
+    elif name == 'csv':
+        provider = CSVProvider(settings['location'])
+    elif name == 'http':
+        provider = HTTPCSVProvider(settings['location'])
+    else:
+        raise ValueError(f"Unknown price provider: {name}")
+    return AsyncFetcher(provider, max_concurrency=settings['max_concurrency'], rate=settings['rate'])
+
+
+def fetch_stage(config, refresh=True):
+    from priceStore import PriceStore
+
+    dates = [config['backtest']['start'], config['backtest']['end']]
+    if not config['backtest']['pairs']:
+        dates += [config['formation']['start'], config['formation']['end']]
+    provider = price_provider(config['universe']['provider'])
+    store = PriceStore(config['universe']['root'], config['universe']['store'], provider)
+    universe = universe_tickers(config)
+    tickers = list(dict.fromkeys(universe + list(config['allocation']['sleeves'])))
+    refresh = refresh and provider is not None
+    return {'universe': universe, 'prices': store.get(tickers, min(dates), max(dates), refresh=refresh)}
+
+
+def screen_stage(config, fetched, cache=None):
+    if config['backtest']['pairs']:
+        return [(ticker1, ticker2, np.nan) for ticker1, ticker2 in _pairs(config)]
+    from pairScreening import screen_pairs
+    from pairSelection import top_pairs
+
+    formation = config['formation']
+    screening = config['screening']
+    data = fetched['prices'].loc[formation['start']:formation['end'], fetched['universe']]
+    data = data.dropna(axis=1, how='all').dropna(axis=1 if formation['dropna'] == 'columns' else 0)
+    candidates = top_pairs(data.corr(), formation['top_n'])
+    return screen_pairs(data, candidates, screening['adf_threshold'], screening['coint_threshold'],
+                        screening['max_pairs'], screening['max_workers'], screening['coint_method'], cache=cache)
+
+
+def backtest_stage(config, fetched, pairs, cache=None):
+    from costModel import CostModel
+    from portfolioAllocation import PortfolioAllocator
+    from portfolioBacktest import PortfolioBacktester
+
+    backtest = config['backtest']
+    allocation = config['allocation']
+    data = fetched['prices'].loc[backtest['start']:backtest['end']]
+    cost_model = CostModel(**backtest['costs']) if backtest['costs'] else None
+    backtester = PortfolioBacktester(pairs, prices=data, window=backtest['window'], hedge=backtest['hedge'],
+                                     hedge_window=backtest['hedge_window'], compact=backtest['compact'],
+                                     cache=cache)
+    backtester.run(1.0, backtest['entry_sigma'], backtest['exit_tolerance'], cost_model)
+
+    sleeves = pd.DataFrame(backtester.returns, index=backtester.index, columns=backtester.names)
+    for ticker in allocation['sleeves']:
+        sleeves[ticker] = data[ticker].reindex(sleeves.index).ffill().pct_change()
+    allocator = PortfolioAllocator(allocation['scheme'], allocation['rebalance'], allocation['threshold'],
+                                   allocation['lookback'], allocation['weights'], allocation['kelly_fraction'],
+                                   allocation['kelly_cap'], allocation['cost_bps'])
+    equity = allocator.run(sleeves, allocation['capital'])
+    return {'equity': equity, 'targets': allocator.targets, 'rebalances': allocator.rebalances,
+            'turnover': allocator.turnover, 'cost_report': backtester.cost_report}
+
+
+def metrics_stage(config, backtest, cache=None):
+    daily = backtest['equity'].pct_change().dropna()
+    monthly = (1 + daily).resample('ME').prod() - 1
+    monthly.name = config['name']
+    table = metrics.metrics_table(monthly, config['metrics']['risk_free_rate'], metrics.MONTHS)
+    return {'daily_returns': daily, 'monthly_returns': monthly, 'table': table}
+
+
+# Each stage: (function, upstream stages, config sections its cache key depends on). fetch is not cached
+# here, since the price store already is its cache; downstream keys use a hash of the prices it returned
+STAGES = {
+    'fetch': (fetch_stage, (), None),
+    'screen': (screen_stage, ('fetch',), ('formation', 'screening.adf_threshold', 'screening.coint_threshold',
+                                          'screening.max_pairs', 'screening.coint_method', 'backtest.pairs')),
+    'backtest': (backtest_stage, ('fetch', 'screen'), ('backtest', 'allocation')),
+    'metrics': (metrics_stage, ('backtest',), ('name', 'metrics')),
+}
+
+
+def _section(config, path):
+    value = config
+    for key in path.split('.'):
+        value = value[key]
+    return value
+
+
+class Pipeline:
+    def __init__(self, config, cache=None):
+        self.config = load_config(config)
+        self.cache = cache if cache is not None else ResultCache(self.config['output']['cache'])
+        self.results = {}
+        self.keys = {}
+        self.cached = {}
+
+    def _order(self, targets):
+        needed, stack = set(), list(targets)
+        while stack:
+            stage = stack.pop()
+            if stage not in STAGES:
+                raise ValueError(f"Unknown pipeline stage: {stage}")
+            if stage not in needed:
+                needed.add(stage)
+                stack.extend(STAGES[stage][1])
+        graph = {stage: STAGES[stage][1] for stage in needed}
+        return list(TopologicalSorter(graph).static_order())
+
+    def run(self, targets=('metrics',), refresh=True):
+        for stage in self._order(targets):
+            if stage in self.results:
+                continue
+            func, upstream, sections = STAGES[stage]
+            with span(f'pipeline_{stage}', config=self.config['name']) as current:
+                if sections is None:
+                    self.results[stage] = func(self.config, refresh=refresh)
+                    self.keys[stage] = fingerprint(f'pipeline_{stage}/1', self.results[stage])
+                    self.cached[stage] = False
+                    continue
+                # A stage's key chains its upstream keys, so any change upstream reruns everything after it
+                key = fingerprint(f'pipeline_{stage}/1', [_section(self.config, path) for path in sections],
+                                  [self.keys[name] for name in upstream])
+                result = self.cache.get(key)
+                self.cached[stage] = result is not None
+                if result is None:
+                    result = func(self.config, *[self.results[name] for name in upstream], cache=self.cache)
+                    self.cache.put(key, result)
+                current.count('cache_hit', int(self.cached[stage]))
+                self.keys[stage] = key
+                self.results[stage] = result
+        return self.results
+
+    def write(self, directory=None):
+        directory = directory or self.config['output']['directory'] or os.path.join('pipeline_output',
+                                                                                   self.config['name'])
+        os.makedirs(directory, exist_ok=True)
+        if 'screen' in self.results:
+            pd.DataFrame(self.results['screen'], columns=['Ticker1', 'Ticker2', 'Correlation']).to_csv(
+                os.path.join(directory, 'pairs.csv'), index=False)
+        if 'backtest' in self.results:
+            backtest = self.results['backtest']
+            backtest['equity'].to_csv(os.path.join(directory, 'equity.csv'))
+            backtest['targets'].to_csv(os.path.join(directory, 'target_weights.csv'))
+            backtest['rebalances'].to_csv(os.path.join(directory, 'rebalances.csv'))
+            if backtest['cost_report'] is not None:
+                backtest['cost_report'].to_csv(os.path.join(directory, 'cost_report.csv'))
+        if 'metrics' in self.results:
+            self.results['metrics']['monthly_returns'].to_csv(os.path.join(directory, 'monthly_returns.csv'),
+                                                              header=['Monthly_Return'])
+            self.results['metrics']['table'].to_csv(os.path.join(directory, 'metrics.csv'))
+        return directory
+
+
+def run_pipeline(config, targets=('metrics',), refresh=True, write=True):
+    pipeline = Pipeline(config)
+    started = time.perf_counter()
+    results = pipeline.run(targets, refresh)
+    directory = pipeline.write() if write else None
+    table = results['metrics']['table'] if 'metrics' in results else None
+    return {'name': pipeline.config['name'], 'directory': directory, 'cached': pipeline.cached,
+            'seconds': time.perf_counter() - started, 'table': table}
+
+
+def run_configs(configs, targets=('metrics',), max_workers=None, write=True):
+    configs = [load_config(config) for config in configs]
+    if len(configs) == 1 or max_workers == 1:
+        return [run_pipeline(config, targets, write=write) for config in configs]
+
+    # Prices are refreshed here one config at a time, so workers never write to the same store together;
+    # each worker then screens serially unless its config asks for more workers
+    for config in configs:
+        fetch_stage(config, refresh=True)
+        if config['screening']['max_workers'] is None:
+            config['screening']['max_workers'] = 1
+    with ProcessPoolExecutor(max_workers) as executor:
+        return list(executor.map(partial(run_pipeline, targets=targets, refresh=False, write=write), configs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the fetch, screen, backtest and metrics pipeline.')
+    parser.add_argument('configs', nargs='+', help='TOML or YAML config files')
+    parser.add_argument('--until', default='metrics', choices=list(STAGES), help='last stage to run')
+    parser.add_argument('--workers', type=int, default=None, help='processes for running configs in parallel')
+    parser.add_argument('--no-write', action='store_true', help='skip writing output files')
+    args = parser.parse_args(argv)
+
+    for summary in run_configs(args.configs, (args.until,), args.workers, write=not args.no_write):
+        cached = ', '.join(stage for stage, hit in summary['cached'].items() if hit) or 'none'
+        print(f"{summary['name']}: {summary['seconds']:.2f} s, cached stages: {cached}"
+              + (f", outputs in {summary['directory']}" if summary['directory'] else ''))
+        if summary['table'] is not None:
+            print(summary['table'].to_string(float_format=lambda value: f'{value:.4f}'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import time
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from metrics import TRADING_DAYS
+from instrumentation import span
+
+SCHEMES = ['equal', 'fixed', 'inverse_volatility', 'risk_parity', 'kelly']
+RISK_PARITY_SWEEPS = 50
+
+
+def window_covariance(returns, rows, window, block_rows=256):
+    # Sample mean and covariance of the `window` returns ending at each row in `rows`, for all rows at once;
+    # rows are taken in blocks to bound the (rows x sleeves x window) copy
+    windows = sliding_window_view(returns, window, axis=0)
+    n_sleeves = returns.shape[1]
+    mean = np.empty((len(rows), n_sleeves))
+    covariance = np.empty((len(rows), n_sleeves, n_sleeves))
+    for start in range(0, len(rows), block_rows):
+        block = windows[rows[start:start + block_rows] - window + 1]
+        mean[start:start + block_rows] = block.mean(axis=2)
+        centered = block - mean[start:start + block_rows, :, None]
+        covariance[start:start + block_rows] = np.einsum('kiw,kjw->kij', centered, centered) / (window - 1)
+    return mean, covariance
+
+
+def risk_parity_weights(covariance):
+    # Equal risk contributions by cyclical coordinate descent on 1/2 y'Cy - sum(log y) / n, run for every
+    # covariance matrix in the batch together; sleeves with no variance are left out
+    n_sleeves = covariance.shape[-1]
+    variance = np.diagonal(covariance, axis1=1, axis2=2)
+    active = variance > 0
+    covariance = np.where(active[:, :, None] & active[:, None, :], covariance, 0)
+    variance = np.where(active, variance, 1)
+    budget = np.where(active, 1 / np.maximum(active.sum(axis=1, keepdims=True), 1), 0)
+
+    y = np.where(active, 1 / np.sqrt(variance), 0)
+    for _ in range(RISK_PARITY_SWEEPS):
+        for i in range(n_sleeves):
+            others = np.einsum('kj,kj->k', covariance[:, i], y) - covariance[:, i, i] * y[:, i]
+            y[:, i] = (np.sqrt(others ** 2 + 4 * variance[:, i] * budget[:, i]) - others) / (2 * variance[:, i])
+    return y / np.maximum(y.sum(axis=1, keepdims=True), np.finfo(float).tiny)
+
+
+class PortfolioAllocator:
+    # Splits capital across sleeves (pairs, ETFs) from their (T x N) daily returns and rebalances back to
+    # target weights at month ends, or whenever any sleeve drifts more than `threshold` from its target.
+    # Targets at a row use returns up to and including that row and are traded at its close
+    def __init__(self, scheme='equal', rebalance='monthly', threshold=0.05, lookback=60, weights=None,
+                 kelly_fraction=0.5, kelly_cap=0.25, cost_bps=0.0):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown allocation scheme: {scheme}")
+        if rebalance not in ('monthly', 'drift', None):
+            raise ValueError(f"Unknown rebalance rule: {rebalance}")
+        if scheme == 'fixed' and weights is None:
+            raise ValueError("The fixed scheme needs weights")
+        self.scheme = scheme
+        self.rebalance = rebalance
+        self.threshold = threshold
+        self.lookback = lookback
+        self.weights = weights
+        self.kelly_fraction = kelly_fraction
+        self.kelly_cap = kelly_cap
+        self.cost_bps = cost_bps
+
+    def target_weights(self, returns, rows):
+        # (rows x N) target weights; whatever a row leaves unallocated is held as cash
+        n_sleeves = returns.shape[1]
+        if self.scheme == 'fixed':
+            return np.tile(np.asarray(self.weights, dtype=np.float64), (len(rows), 1))
+        targets = np.full((len(rows), n_sleeves), 1 / n_sleeves)
+        if self.scheme == 'equal':
+            return targets
+
+        # Rows without a full lookback window keep equal weights
+        ready = rows >= self.lookback - 1
+        mean, covariance = window_covariance(returns, rows[ready], self.lookback)
+        variance = np.diagonal(covariance, axis1=1, axis2=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.scheme == 'inverse_volatility':
+                weights = np.where(variance > 0, 1 / np.sqrt(variance), 0)
+                weights = weights / weights.sum(axis=1, keepdims=True)
+            elif self.scheme == 'risk_parity':
+                weights = risk_parity_weights(covariance)
+            else:
+                # Fractional Kelly per sleeve, long only and capped, scaled down if the book would be levered
+                weights = np.clip(self.kelly_fraction * np.where(variance > 0, mean / variance, 0), 0, self.kelly_cap)
+                weights = weights / np.maximum(weights.sum(axis=1, keepdims=True), 1)
+        # A row where every sleeve was flat over the window falls back to equal weights
+        valid = np.isfinite(weights).all(axis=1) & (weights.sum(axis=1) > 0)
+        targets[np.flatnonzero(ready)[valid]] = weights[valid]
+        return targets
+
+    def rebalance_rows(self, index, growth, targets):
+        if self.rebalance is None:
+            return np.array([0])
+        if self.rebalance == 'monthly':
+            months = index.to_period('M')
+            return np.concatenate([[0], np.flatnonzero(months[1:] != months[:-1])])
+
+        # Drift: one step per rebalance rather than per row, each finding the first later row whose drifted
+        # weights have moved past the threshold from that row's targets
+        rows = [0]
+        while rows[-1] < len(growth) - 1:
+            start = rows[-1]
+            held = targets[start] * (growth[start + 1:] / growth[start])
+            value = held.sum(axis=1) + 1 - targets[start].sum()
+            drift = np.abs(held / value[:, None] - targets[start + 1:]).max(axis=1)
+            breaches = np.flatnonzero(drift > self.threshold)
+            if not len(breaches):
+                break
+            rows.append(start + 1 + breaches[0])
+        return np.array(rows)
+
+    def run(self, returns, capital=1.0):
+        if not isinstance(returns, pd.DataFrame):
+            raise TypeError("returns must be a DataFrame with a DatetimeIndex")
+        index = returns.index
+        names = list(returns.columns)
+        values = np.nan_to_num(returns.to_numpy(dtype=np.float64))
+        growth = np.cumprod(1 + values, axis=0)
+
+        with span('allocation', rows=len(index), sleeves=len(names), scheme=self.scheme):
+            if self.rebalance == 'drift':
+                targets = self.target_weights(values, np.arange(len(index)))
+                rows = self.rebalance_rows(index, growth, targets)
+                targets = targets[rows]
+            else:
+                rows = self.rebalance_rows(index, growth, None)
+                targets = self.target_weights(values, rows)
+
+            # Row t is in the segment of the last rebalance before it; a rebalance row still earns its own
+            # return on the old weights and only then trades
+            segment = np.maximum(np.searchsorted(rows, np.arange(len(index)), side='left') - 1, 0)
+            held = targets[segment] * (growth / growth[rows[segment]])
+            cash = 1 - targets.sum(axis=1)
+            segment_growth = held.sum(axis=1) + cash[segment]
+            drifted = held / segment_growth[:, None]
+
+            # Turnover is the sum of absolute weight changes traded at each rebalance, charged at cost_bps
+            turnover = np.abs(targets[1:] - drifted[rows[1:]]).sum(axis=1)
+            charge = np.ones(len(index))
+            charge[rows[1:]] = 1 - self.cost_bps / 1e4 * turnover
+            compounded = np.cumprod(segment_growth[rows[1:]] * charge[rows[1:]])
+            equity = capital * np.concatenate([[1.0], compounded])[segment] * segment_growth * charge
+
+        self.rows = rows
+        self.targets = pd.DataFrame(targets, index=index[rows], columns=names)
+        self.drifted_weights = pd.DataFrame(drifted, index=index, columns=names)
+        self.rebalances = pd.DataFrame({'Turnover': turnover}, index=pd.Index(index[rows[1:]], name='Date'))
+        years = len(index) / TRADING_DAYS
+        self.turnover = {
+            'Rebalances': len(turnover),
+            'Total_Turnover': float(turnover.sum()),
+            'Annual_Turnover': float(turnover.sum() / years) if years else np.nan,
+            'Mean_Turnover': float(turnover.mean()) if len(turnover) else 0.0,
+        }
+        return pd.Series(equity, index=index, name='Total_Portfolio_Value')
+
+
+if __name__ == "__main__":
+    from portfolioBacktest import PortfolioBacktester, synthetic_prices
+
+    prices = synthetic_prices(40, 2520)
+    pairs = [(f'T{2 * k}', f'T{2 * k + 1}') for k in range(20)]
+    backtester = PortfolioBacktester(pairs, prices=prices)
+    backtester.run(1.0)
+    sleeves = pd.DataFrame(backtester.returns, index=backtester.index, columns=backtester.names)
+
+    for scheme in ['equal', 'inverse_volatility', 'risk_parity', 'kelly']:
+        for rebalance in ['monthly', 'drift']:
+            allocator = PortfolioAllocator(scheme, rebalance, threshold=0.02, cost_bps=5)
+            start = time.perf_counter()
+            equity = allocator.run(sleeves, 1_000_000.0)
+            elapsed = time.perf_counter() - start
+            print(f"{scheme:>18} {rebalance:>7}: {elapsed * 1e3:7.1f} ms, {allocator.turnover['Rebalances']:4d} "
+                  f"rebalances, annual turnover {allocator.turnover['Annual_Turnover']:6.2f}, "
+                  f"final value {equity.iloc[-1]:,.0f}")
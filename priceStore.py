@@ -0,0 +1,224 @@
+import io
+import json
+import os
+import urllib.request
+import numpy as np
+import pandas as pd
+from instrumentation import span
+
+
+class YFinanceProvider:
+    def fetch(self, tickers, start_date, end_date):
+        import yfinance as yf
+
+        if len(tickers) == 1:
+            # yf.download keeps module-level state between calls, so the concurrent single-symbol
+            # fetches made by AsyncFetcher go through Ticker.history instead
+            history = yf.Ticker(tickers[0]).history(start=start_date, end=end_date, auto_adjust=False)
+            return history[['Adj Close']].rename(columns={'Adj Close': tickers[0]})
+        data = yf.download(list(tickers), start=start_date, end=end_date)['Adj Close']
+        if isinstance(data, pd.Series):
+            data = data.to_frame(tickers[0])
+        return data
+
+
+def read_price_csv(source, start_date, end_date):
+    # Date index and one price column; rows whose date or price does not parse (extra header rows) are dropped
+    raw = pd.read_csv(source, index_col=0)
+    raw.index = pd.to_datetime(raw.index, errors='coerce')
+    prices = pd.to_numeric(raw.iloc[:, 0], errors='coerce')
+    prices = prices[prices.index.notna()].dropna()
+    return prices[(prices.index >= start_date) & (prices.index < end_date)]
+
+
+class CSVProvider:
+    # One CSV per symbol, e.g. the files download_data.py used to write into historical_data/
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, tickers, start_date, end_date):
+        columns = {}
+        for ticker in tickers:
+            csv_path = os.path.join(self.directory, f"{ticker}.csv")
+            if not os.path.exists(csv_path):
+                continue
+            columns[ticker] = read_price_csv(csv_path, start_date, end_date)
+        return pd.DataFrame(columns)
+
+
+class HTTPCSVProvider:
+    # One CSV per symbol from a URL template such as 'http://localhost:8000/{ticker}.csv?start={start}&end={end}'
+    def __init__(self, url_template, timeout=30):
+        self.url_template = url_template
+        self.timeout = timeout
+
+    def fetch(self, tickers, start_date, end_date):
+        start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        columns = {}
+        for ticker in tickers:
+            url = self.url_template.format(ticker=urllib.request.quote(ticker), start=start_date.date(),
+                                           end=end_date.date())
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                body = response.read().decode()
+            columns[ticker] = read_price_csv(io.StringIO(body), start_date, end_date)
+        return pd.DataFrame(columns)
+
+
+class PriceStore:
+    def __init__(self, root='price_store', universe='default', provider=None):
+        self.path = os.path.join(root, universe)
+        self.provider = provider if provider is not None else YFinanceProvider()
+        os.makedirs(self.path, exist_ok=True)
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if os.path.exists(self._file('meta.json')):
+            with open(self._file('meta.json')) as f:
+                meta = json.load(f)
+            self.tickers = meta['tickers']
+            self.start = pd.Timestamp(meta['start'])
+            self.end = pd.Timestamp(meta['end'])
+            # Stores written before per-ticker coverage share the universe's range
+            coverage = meta.get('coverage', {ticker: [meta['start'], meta['end']] for ticker in self.tickers})
+            self.coverage = {ticker: (pd.Timestamp(start), pd.Timestamp(end)) for ticker, (start, end) in
+                             coverage.items()}
+            self.dates = np.load(self._file('dates.npy'))
+            self.prices = np.load(self._file('prices.npy'), mmap_mode='r')
+        else:
+            self.tickers = []
+            self.start = None
+            self.end = None
+            self.coverage = {}
+            self.dates = np.array([], dtype='datetime64[ns]')
+            self.prices = np.empty((0, 0))
+        self.columns = {ticker: j for j, ticker in enumerate(self.tickers)}
+
+    def frame(self):
+        return pd.DataFrame(self.prices, index=pd.DatetimeIndex(self.dates, name='Date'),
+                            columns=self.tickers, copy=False)
+
+    def missing_ranges(self, tickers, start_date, end_date):
+        # Each ticker is fetched only where the request runs past its own coverage; tickers missing the
+        # same range are grouped into one request
+        start_date = pd.Timestamp(start_date)
+        end_date = pd.Timestamp(end_date)
+        needed = {}
+        for ticker in tickers:
+            if ticker not in self.coverage:
+                gaps = [(start_date, end_date)]
+            else:
+                covered_start, covered_end = self.coverage[ticker]
+                gaps = []
+                if start_date < covered_start:
+                    gaps.append((start_date, covered_start))
+                if end_date > covered_end:
+                    gaps.append((covered_end, end_date))
+            for gap in gaps:
+                needed.setdefault(gap, []).append(ticker)
+        return [(range_tickers, range_start, range_end) for (range_start, range_end), range_tickers in needed.items()]
+
+    def refresh(self, tickers, start_date, end_date):
+        ranges = self.missing_ranges(tickers, start_date, end_date)
+        if not ranges:
+            return False
+
+        combined = self.frame() if self.tickers else pd.DataFrame()
+        coverage = dict(self.coverage)
+        for range_tickers, range_start, range_end in ranges:
+            with span('download', universe=os.path.basename(self.path), tickers=len(range_tickers)) as current:
+                fetched = self.provider.fetch(range_tickers, range_start, range_end)
+                current.set(rows=len(fetched))
+                current.count('empty_tickers', len(range_tickers) - int(fetched.notna().any().sum()))
+
+            # Coverage only grows for tickers the provider returned prices for. A symbol whose download failed,
+            # whether it was left out or came back as an all-NaN column (yf.download does this), keeps its gap
+            # and is asked for again on the next refresh
+            for ticker in fetched.columns.intersection(range_tickers):
+                if not fetched[ticker].notna().any():
+                    continue
+                if ticker in coverage:
+                    covered_start, covered_end = coverage[ticker]
+                    coverage[ticker] = (min(covered_start, range_start), max(covered_end, range_end))
+                else:
+                    coverage[ticker] = (range_start, range_end)
+            if not len(fetched):
+                continue
+            fetched.index = pd.DatetimeIndex(fetched.index).tz_localize(None)
+            combined = fetched.combine_first(combined) if not combined.empty else fetched
+
+        columns = self.tickers + [ticker for ticker in dict.fromkeys(tickers)
+                                  if ticker not in self.columns and ticker in coverage]
+        if columns == self.tickers and coverage == self.coverage:
+            return False
+        self._write(combined.reindex(columns=columns).sort_index(), coverage)
+        return True
+
+    def _write(self, data, coverage):
+        # Column-major so every ticker's history is one contiguous block in the memory map
+        prices = np.asfortranarray(data.to_numpy(dtype=np.float64))
+        dates = data.index.to_numpy(dtype='datetime64[ns]')
+
+        for name, array in [('prices.npy', prices), ('dates.npy', dates)]:
+            tmp_path = self._file(name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, self._file(name))
+
+        coverage = {ticker: coverage[ticker] for ticker in data.columns}
+        tmp_path = self._file('meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'tickers': list(data.columns),
+                       'start': min(start for start, _ in coverage.values()).isoformat(),
+                       'end': max(end for _, end in coverage.values()).isoformat(),
+                       'coverage': {ticker: [start.isoformat(), end.isoformat()]
+                                    for ticker, (start, end) in coverage.items()}}, f)
+        os.replace(tmp_path, self._file('meta.json'))
+        self._load()
+
+    def _bounds(self, start_date, end_date):
+        lo = 0 if start_date is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start_date)))
+        hi = len(self.dates) if end_date is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end_date)))
+        return lo, hi
+
+    def array(self, tickers=None, start_date=None, end_date=None):
+        lo, hi = self._bounds(start_date, end_date)
+        if tickers is None:
+            return self.dates[lo:hi], self.prices[lo:hi]
+
+        positions = [self.columns[ticker] for ticker in tickers]
+        if positions == list(range(positions[0], positions[0] + len(positions))):
+            return self.dates[lo:hi], self.prices[lo:hi, positions[0]:positions[-1] + 1]
+        return self.dates[lo:hi], self.prices[lo:hi, positions]
+
+    def iter_chunks(self, tickers, start_date, end_date, chunk_rows=100_000, refresh=True):
+        # Time-ordered blocks of rows read off the memory map, so only one chunk is ever in memory
+        tickers = list(tickers)
+        if refresh:
+            self.refresh(tickers, start_date, end_date)
+        lo, hi = self._bounds(start_date, end_date)
+        positions = [self.columns[ticker] for ticker in tickers]
+        for start in range(lo, hi, chunk_rows):
+            stop = min(start + chunk_rows, hi)
+            yield self.dates[start:stop], np.asarray(self.prices[start:stop][:, positions], dtype=np.float64)
+
+    def get(self, tickers, start_date, end_date, refresh=True, dtype=None):
+        tickers = list(tickers)
+        if refresh:
+            self.refresh(tickers, start_date, end_date)
+        # Tickers the store has never received data for come back as empty columns
+        stored = [ticker for ticker in tickers if ticker in self.columns]
+        with span('align', universe=os.path.basename(self.path)) as current:
+            if stored:
+                dates, prices = self.array(stored, start_date, end_date)
+            else:
+                lo, hi = self._bounds(start_date, end_date)
+                dates, prices = self.dates[lo:hi], np.empty((hi - lo, 0))
+            if dtype is not None:
+                # Cast while slicing so callers never hold a float64 copy of a compact panel
+                prices = prices.astype(dtype)
+            current.set(rows=len(dates))
+        data = pd.DataFrame(prices, index=pd.DatetimeIndex(dates, name='Date'), columns=stored, copy=False)
+        return data if len(stored) == len(tickers) else data.reindex(columns=tickers)
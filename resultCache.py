@@ -0,0 +1,149 @@
+import hashlib
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+_MISSING = object()
+
+
+def _update(digest, value):
+    # Every value is written with a type tag so that, e.g., the string '1' and the integer 1 hash differently
+    if isinstance(value, np.ndarray):
+        digest.update(f'ndarray:{value.dtype.str}:{value.shape}'.encode())
+        if value.dtype == object:
+            digest.update(pickle.dumps(value.tolist()))
+        else:
+            digest.update(np.ascontiguousarray(value).view(np.uint8).data)
+    elif isinstance(value, pd.DataFrame):
+        digest.update(b'DataFrame')
+        _update(digest, value.columns)
+        _update(digest, value.index)
+        for column in range(value.shape[1]):
+            _update(digest, value.iloc[:, column].to_numpy())
+    elif isinstance(value, pd.Series):
+        digest.update(b'Series')
+        _update(digest, value.name)
+        _update(digest, value.index)
+        _update(digest, value.to_numpy())
+    elif isinstance(value, pd.Index):
+        digest.update(b'Index')
+        _update(digest, value.to_numpy())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}:{len(value)}'.encode())
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f'dict:{len(value)}'.encode())
+        for key in sorted(value, key=repr):
+            _update(digest, key)
+            _update(digest, value[key])
+    elif value is None or isinstance(value, (str, bytes, bool, int, float, np.generic, pd.Timestamp)):
+        digest.update(f'{type(value).__name__}:{value!r}'.encode())
+    elif hasattr(value, '__dict__'):
+        # Plain parameter objects such as CostModel hash by class and attributes
+        digest.update(f'object:{type(value).__qualname__}'.encode())
+        _update(digest, vars(value))
+    else:
+        digest.update(pickle.dumps(value))
+
+
+def fingerprint(*parts):
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        _update(digest, part)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # Content-addressed pickles on disk; reads refresh a file's mtime and eviction removes the oldest first
+    def __init__(self, root='result_cache', max_bytes=512 * 2 ** 20):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self.size = sum(stat.st_size for _, stat in self._stats())
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f'{key}.pkl')
+
+    def _entries(self):
+        for directory in os.scandir(self.root):
+            if directory.is_dir():
+                yield from (entry for entry in os.scandir(directory.path) if entry.name.endswith('.pkl'))
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        except (EOFError, pickle.UnpicklingError):
+            os.remove(path)
+            self.misses += 1
+            return default
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process after it was read; the value is still good
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # An overwritten entry's bytes are already counted
+        size = os.path.getsize(tmp_path)
+        try:
+            size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+        self.size += size
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def _stats(self):
+        # Entries removed by another process between the directory scan and the stat are skipped
+        for entry in self._entries():
+            try:
+                yield entry.path, entry.stat()
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        entries = sorted(self._stats(), key=lambda item: item[1].st_mtime)
+        self.size = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= stat.st_size
+
+    def clear(self):
+        for entry in list(self._entries()):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        self.size = 0
+
+    def memoize(self, namespace, func, *args, **kwargs):
+        # namespace names the computation and should carry a version to bump when its logic changes
+        key = fingerprint(namespace, args, kwargs)
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func(*args, **kwargs)
+            self.put(key, value)
+        return value
+
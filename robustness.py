@@ -0,0 +1,132 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import time
+import numpy as np
+import pandas as pd
+from metrics import TRADING_DAYS, cagr, max_drawdown, rolling_moments, sharpe_ratio, sortino_ratio
+from signalEngine import bollinger_positions
+
+METRICS = ['CAGR', 'Sharpe_Ratio', 'Sortino_Ratio', 'Max_Drawdown']
+
+
+def block_indices(rng, n_paths, n_rows, block_size):
+    # Circular block bootstrap: each path strings together blocks of consecutive rows from random starts
+    n_blocks = -(-n_rows // block_size)
+    starts = rng.integers(0, n_rows, (n_paths, n_blocks))
+    rows = (starts[:, :, None] + np.arange(block_size)) % n_rows
+    return rows.reshape(n_paths, -1)[:, :n_rows]
+
+
+def book_metrics(total_equity, risk_free_rate=0.02, periods_per_year=TRADING_DAYS):
+    # total_equity is (T x paths); every metric is computed for all paths at once
+    returns = total_equity[1:] / total_equity[:-1] - 1
+    return {
+        'CAGR': cagr(returns, periods_per_year),
+        'Sharpe_Ratio': sharpe_ratio(returns, risk_free_rate, periods_per_year),
+        'Sortino_Ratio': sortino_ratio(returns, risk_free_rate, periods_per_year),
+        'Max_Drawdown': max_drawdown(returns),
+    }
+
+
+def returns_batch(seed, returns, capital, n_paths, block_size, risk_free_rate, periods_per_year):
+    # Resample whole rows of the book's (T x pairs) strategy returns so cross-pair correlation is kept
+    rng = np.random.default_rng(seed)
+    rows = block_indices(rng, n_paths, len(returns), block_size)
+    total = np.zeros((len(returns), n_paths))
+    for j in range(returns.shape[1]):
+        total += capital[j] * np.cumprod(1 + returns[rows, j].T, axis=0)
+    return book_metrics(total, risk_free_rate, periods_per_year)
+
+
+def spread_batch(seed, log_returns1, log_returns2, start_ratios, capital, n_paths, block_size, window,
+                 entry_sigma, exit_tolerance, risk_free_rate, periods_per_year):
+    # Resample both legs' log returns on the same rows, rebuild each pair's ratio path and rerun the
+    # Bollinger signals on it; arrays are (T x paths) so every path in the batch moves together.
+    # seed=None runs the observed path instead of resamples
+    n_rows = len(log_returns1) + 1
+    rows = None
+    if seed is not None:
+        rows = block_indices(np.random.default_rng(seed), n_paths, n_rows - 1, block_size).T
+    total = np.zeros((n_rows, 1 if rows is None else n_paths))
+
+    for j in range(log_returns1.shape[1]):
+        leg1 = log_returns1[:, j][:, None] if rows is None else log_returns1[rows, j]
+        leg2 = log_returns2[:, j][:, None] if rows is None else log_returns2[rows, j]
+        ratio = np.empty((n_rows, leg1.shape[1]))
+        ratio[0] = start_ratios[j]
+        ratio[1:] = start_ratios[j] * np.exp(np.cumsum(leg1 - leg2, axis=0))
+
+        ratio_ma, ratio_sd = rolling_moments(ratio, window)
+        positions = bollinger_positions(ratio, ratio_ma, ratio_ma + entry_sigma * ratio_sd,
+                                        ratio_ma - entry_sigma * ratio_sd, window, exit_tolerance)
+        returns = np.zeros(ratio.shape)
+        returns[1:] = positions[:-1] * (np.expm1(leg1) - np.expm1(leg2))
+        total += capital[j] * np.cumprod(1 + returns, axis=0)
+    return book_metrics(total, risk_free_rate, periods_per_year)
+
+
+def bootstrap(prices, pairs, n_paths=10_000, method='spread', block_size=20, batch_size=250, window=20,
+              entry_sigma=2, exit_tolerance=.01, allocated_capital=1.0, seed=0, max_workers=None,
+              confidence=.95, risk_free_rate=0.02, periods_per_year=TRADING_DAYS):
+    pairs = [tuple(pair[:2]) for pair in pairs]
+    tickers = list(dict.fromkeys(ticker for pair in pairs for ticker in pair))
+    data = prices[tickers].ffill().dropna()
+    capital = np.broadcast_to(np.asarray(allocated_capital, dtype=np.float64), (len(pairs),))
+
+    if method == 'spread':
+        # Each leg's log returns; resampled paths restart every pair from its first observed ratio
+        log_prices = np.log(data.to_numpy(dtype=np.float64))
+        log_returns = np.diff(log_prices, axis=0)
+        columns = {ticker: j for j, ticker in enumerate(tickers)}
+        leg1 = [columns[ticker1] for ticker1, _ in pairs]
+        leg2 = [columns[ticker2] for _, ticker2 in pairs]
+        start_ratios = np.exp(log_prices[0, leg1] - log_prices[0, leg2])
+        task = partial(spread_batch, log_returns1=log_returns[:, leg1], log_returns2=log_returns[:, leg2],
+                       start_ratios=start_ratios, capital=capital, block_size=block_size, window=window,
+                       entry_sigma=entry_sigma, exit_tolerance=exit_tolerance, risk_free_rate=risk_free_rate,
+                       periods_per_year=periods_per_year)
+        observed = task(None, n_paths=1)
+    elif method == 'returns':
+        from portfolioBacktest import PortfolioBacktester
+
+        backtester = PortfolioBacktester(pairs, window=window, prices=data)
+        equity = backtester.run(capital, entry_sigma, exit_tolerance)
+        task = partial(returns_batch, returns=backtester.returns, capital=capital, block_size=block_size,
+                       risk_free_rate=risk_free_rate, periods_per_year=periods_per_year)
+        observed = book_metrics(equity.sum(axis=1).to_numpy()[:, None], risk_free_rate, periods_per_year)
+    else:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+
+    # One child seed per batch, so the paths drawn do not depend on the number of workers
+    sizes = [min(batch_size, n_paths - start) for start in range(0, n_paths, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if max_workers == 1:
+        results = [task(seed, n_paths=size) for seed, size in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = [executor.submit(task, seed, n_paths=size) for seed, size in zip(seeds, sizes)]
+            results = [future.result() for future in futures]
+
+    samples = pd.DataFrame({name: np.concatenate([result[name] for result in results]) for name in METRICS})
+    tail = (1 - confidence) / 2
+    summary = pd.DataFrame({
+        'Observed': [float(np.squeeze(observed[name])) for name in METRICS],
+        'Mean': samples.mean(),
+        'Lower': samples.quantile(tail),
+        'Median': samples.median(),
+        'Upper': samples.quantile(1 - tail),
+    }, index=METRICS)
+    return summary, samples
+
+
+if __name__ == "__main__":
+    from portfolioBacktest import synthetic_prices
+
+    prices = synthetic_prices(20, 2520)
+    pairs = [(f'T{2 * k}', f'T{2 * k + 1}') for k in range(10)]
+    for method in ['returns', 'spread']:
+        start = time.perf_counter()
+        summary, samples = bootstrap(prices, pairs, n_paths=10_000, method=method, allocated_capital=65000.0)
+        elapsed = time.perf_counter() - start
+        print(f"{method}: {len(samples)} paths for {len(pairs)} pairs x {len(prices)} days in {elapsed:.2f} s")
+        print(summary.to_string(float_format=lambda value: f'{value:.4f}'))
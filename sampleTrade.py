@@ -56,17 +56,12 @@
 
 import pandas as pd
 import matplotlib.pyplot as plt
+from priceStore import PriceStore
 
-heating_oil_data = pd.read_csv('historical_data/HO=F.csv', skiprows=3, names=["Date", "Price"])
-brent_oil_data = pd.read_csv('historical_data/BZ=F.csv', skiprows=3, names=["Date", "Price"])
-
-for df in [heating_oil_data, brent_oil_data]:
-    df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
-    df["Price"] = pd.to_numeric(df["Price"], errors='coerce')
-    df.dropna(inplace=True)
-
-# Merge the data on Date
-merged_data = pd.merge(heating_oil_data, brent_oil_data, on="Date", suffixes=('_HO', '_Brent'))
+# Load both legs from the local price store filled by download_data.py
+prices = PriceStore(universe='pairs').get(['HO=F', 'BZ=F'], '2014-01-01', '2024-11-01').dropna()
+merged_data = pd.DataFrame({"Date": prices.index, "Price_HO": prices['HO=F'].to_numpy(),
+                            "Price_Brent": prices['BZ=F'].to_numpy()})
 
 # Filter data for the 2014-2015 range
 filtered_data = merged_data[(merged_data["Date"].dt.year >= 2014) & (merged_data["Date"].dt.year <= 2014)]
@@ -0,0 +1,84 @@
+import time
+import numpy as np
+import pandas as pd
+
+HOLD = 2
+
+
+def bollinger_positions(ratio, ratio_ma, upper_band, lower_band, window, exit_tolerance=.01, initial=None):
+    ratio = np.asarray(ratio, dtype=float)
+    ratio_ma = np.asarray(ratio_ma, dtype=float)
+    upper_band = np.asarray(upper_band, dtype=float)
+    lower_band = np.asarray(lower_band, dtype=float)
+
+    # Same precedence as the loop in backtest_pair: short, long, exit, otherwise hold
+    events = np.full(ratio.shape, HOLD, dtype=np.int8)
+    events[np.abs(ratio - ratio_ma) < exit_tolerance] = 0
+    events[ratio < lower_band] = 1
+    events[ratio > upper_band] = -1
+    events[:window] = 0
+    # A chunk of a longer series holds whatever position the previous chunk ended in
+    if initial is not None:
+        events = np.concatenate([np.asarray(initial, dtype=np.int8).reshape((1,) + events.shape[1:]), events])
+
+    # Forward-fill the last non-hold event along the time axis
+    steps = np.arange(len(events)).reshape((-1,) + (1,) * (events.ndim - 1))
+    last_event = np.where(events != HOLD, steps, 0)
+    np.maximum.accumulate(last_event, axis=0, out=last_event)
+    positions = np.take_along_axis(events, last_event, axis=0)
+    if initial is not None:
+        positions = positions[1:]
+    return positions.astype(np.int64)
+
+
+def bollinger_position_series(data, window, exit_tolerance=.01):
+    positions = bollinger_positions(data['Price_Ratio'], data['Ratio_MA'], data['Upper_Band'],
+                                    data['Lower_Band'], window, exit_tolerance)
+    return pd.Series(positions, index=data.index, name='Position')
+
+
+def loop_positions(data, window, exit_tolerance=.01):
+    position = pd.Series(0, index=data.index, name='Position')
+    for i in range(window, len(data)):
+        if data['Price_Ratio'].iloc[i] > data['Upper_Band'].iloc[i]:
+            position.iloc[i] = -1
+        elif data['Price_Ratio'].iloc[i] < data['Lower_Band'].iloc[i]:
+            position.iloc[i] = 1
+        elif abs(data['Price_Ratio'].iloc[i] - data['Ratio_MA'].iloc[i]) < exit_tolerance:
+            position.iloc[i] = 0
+        else:
+            position.iloc[i] = position.iloc[i - 1]
+    return position
+
+
+def synthetic_ratio_frame(n_bars, window=20, seed=0):
+    rng = np.random.default_rng(seed)
+    ratio = 1 + np.cumsum(rng.normal(0, .01, n_bars)) * .1
+    data = pd.DataFrame({'Price_Ratio': ratio}, index=pd.RangeIndex(n_bars))
+    data['Ratio_MA'] = data['Price_Ratio'].rolling(window=window).mean()
+    data['Ratio_SD'] = data['Price_Ratio'].rolling(window=window).std()
+    data['Upper_Band'] = data['Ratio_MA'] + 2 * data['Ratio_SD']
+    data['Lower_Band'] = data['Ratio_MA'] - 2 * data['Ratio_SD']
+    return data
+
+
+if __name__ == "__main__":
+    window = 20
+
+    for n_bars in [1_000, 10_000, 100_000, 1_000_000, 10_000_000]:
+        data = synthetic_ratio_frame(n_bars, window)
+
+        start = time.perf_counter()
+        vectorized = bollinger_position_series(data, window)
+        vectorized_time = time.perf_counter() - start
+
+        if n_bars <= 100_000:
+            start = time.perf_counter()
+            looped = loop_positions(data, window)
+            loop_time = time.perf_counter() - start
+            if not vectorized.equals(looped):
+                raise AssertionError(f"Position mismatch at {n_bars} bars")
+            print(f"{n_bars:>10} bars: vectorized {vectorized_time * 1e3:9.2f} ms, "
+                  f"loop {loop_time * 1e3:10.2f} ms, parity ok")
+        else:
+            print(f"{n_bars:>10} bars: vectorized {vectorized_time * 1e3:9.2f} ms")
@@ -1,5 +1,5 @@
-import numpy as np
 import pandas as pd
+import metrics
 
 file_path = 'S&P 500 Monthly Returns.xlsx'
 data = pd.ExcelFile(file_path)
@@ -23,32 +23,25 @@ filtered_data = df_cleaned[(df_cleaned['Date'] >= '2014-01-01') & (df_cleaned['D
 filtered_data['Return'] = filtered_data['Return'] / 100
 
 
-total_months = len(filtered_data)
-annualized_return = (np.prod(1 + filtered_data['Return']) ** (12 / total_months)) - 1
-
-
-start_value = 1
-end_value = np.prod(1 + filtered_data['Return'])
-years = total_months / 12
-cagr = (end_value / start_value) ** (1 / years) - 1
-
-
-std_dev = filtered_data['Return'].std() * np.sqrt(12)
-
-
 risk_free_rate = 2.457872419 / 100
-sharpe_ratio = (annualized_return - risk_free_rate) / std_dev
-
-
-downside_returns = filtered_data['Return'][filtered_data['Return'] < 0]
-downside_std_dev = downside_returns.std() * np.sqrt(12)
-sortino_ratio = (annualized_return - risk_free_rate) / downside_std_dev
-
-
-print({
-    "Annualized Return": annualized_return,
-    "CAGR": cagr,
-    "Standard Deviation": std_dev,
-    "Sharpe Ratio": sharpe_ratio,
-    "Sortino Ratio": sortino_ratio
-})
+monthly_returns = filtered_data['Return']
+
+
+def benchmark_metrics(monthly_returns, risk_free_rate):
+    # This benchmark has always quoted the geometric annual return, and takes Sharpe and Sortino over it,
+    # with the sample std of the negative months as the downside deviation
+    annualized_return = metrics.cagr(monthly_returns, metrics.MONTHS)
+    return {
+        "Annualized Return": annualized_return,
+        "CAGR": annualized_return,
+        "Standard Deviation": metrics.annualized_volatility(monthly_returns, metrics.MONTHS),
+        "Sharpe Ratio": metrics.sharpe_ratio(monthly_returns, risk_free_rate, metrics.MONTHS,
+                                             annual_return=annualized_return),
+        "Sortino Ratio": metrics.sortino_ratio(monthly_returns, risk_free_rate, metrics.MONTHS,
+                                               annual_return=annualized_return, ddof=1),
+        "Max Drawdown": metrics.max_drawdown(monthly_returns),
+        "Skew": metrics.skewness(monthly_returns)
+    }
+
+
+print(benchmark_metrics(monthly_returns, risk_free_rate))
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+from portfolioBacktest import pair_signals
+
+
+class SignalBook:
+    # Struct-of-arrays state for many pairs: one ring buffer row and one set of running sums per pair
+    def __init__(self, n_pairs, window=20, entry_sigma=2, exit_tolerance=.01, resync_every=None):
+        self.window = window
+        self.entry_sigma = entry_sigma
+        self.exit_tolerance = exit_tolerance
+        self.resync_every = resync_every or window
+        self.buffer = np.zeros((n_pairs, window))
+        self.head = np.zeros(n_pairs, dtype=np.int64)
+        self.bars = np.zeros(n_pairs, dtype=np.int64)
+        self.shift = np.full(n_pairs, np.nan)
+        self.sums = np.zeros(n_pairs)
+        self.squares = np.zeros(n_pairs)
+        self.missing = np.zeros(n_pairs, dtype=np.int64)
+        self.positions = np.zeros(n_pairs, dtype=np.int8)
+
+    def _resync(self, pairs):
+        # Recompute the running sums from the buffer now and then so rounding error cannot build up
+        values = self.buffer[pairs]
+        valid = ~np.isnan(values)
+        centered = np.where(valid, values - self.shift[pairs, None], 0)
+        self.sums[pairs] = centered.sum(axis=1)
+        self.squares[pairs] = (centered ** 2).sum(axis=1)
+        self.missing[pairs] = (~valid).sum(axis=1)
+
+    def update(self, ratios, pairs=None):
+        pairs = np.arange(len(self.bars)) if pairs is None else np.asarray(pairs)
+        ratios = np.asarray(ratios, dtype=np.float64)
+        window = self.window
+
+        # Values are kept relative to each pair's first ratio so sum-of-squares stays well conditioned
+        first = np.isnan(self.shift[pairs]) & ~np.isnan(ratios)
+        self.shift[pairs[first]] = ratios[first]
+        shift = self.shift[pairs]
+
+        full = self.bars[pairs] >= window
+        old = np.where(full, self.buffer[pairs, self.head[pairs]], 0)
+        old_missing = full & np.isnan(old)
+        old_centered = np.where(full & ~old_missing, old - shift, 0)
+        new_missing = np.isnan(ratios)
+        new_centered = np.where(new_missing, 0, ratios - shift)
+
+        self.sums[pairs] += new_centered - old_centered
+        self.squares[pairs] += new_centered ** 2 - old_centered ** 2
+        self.missing[pairs] += new_missing.astype(np.int64) - old_missing
+        self.buffer[pairs, self.head[pairs]] = ratios
+        self.head[pairs] = (self.head[pairs] + 1) % window
+        self.bars[pairs] += 1
+
+        resync = pairs[(self.bars[pairs] >= window) & (self.bars[pairs] % self.resync_every == 0)]
+        if len(resync):
+            self._resync(resync)
+
+        sums = self.sums[pairs]
+        ratio_ma = sums / window + shift
+        variance = (self.squares[pairs] - sums ** 2 / window) / (window - 1)
+        ratio_sd = np.sqrt(np.maximum(variance, 0))
+        defined = (self.bars[pairs] > window) & (self.missing[pairs] == 0)
+        ratio_ma = np.where(defined, ratio_ma, np.nan)
+        upper_band = ratio_ma + self.entry_sigma * ratio_sd
+        lower_band = ratio_ma - self.entry_sigma * ratio_sd
+
+        # Same precedence as backtest_pair: short, long, exit, otherwise hold
+        positions = self.positions[pairs]
+        positions = np.where(np.abs(ratios - ratio_ma) < self.exit_tolerance, 0, positions)
+        positions = np.where(ratios < lower_band, 1, positions)
+        positions = np.where(ratios > upper_band, -1, positions)
+        self.positions[pairs] = positions
+        return self.positions[pairs]
+
+    def update_prices(self, ticker1_prices, ticker2_prices, pairs=None):
+        return self.update(np.asarray(ticker1_prices, dtype=np.float64) / np.asarray(ticker2_prices, dtype=np.float64),
+                           pairs)
+
+
+class PairSignal:
+    # Single-pair view over a one-row SignalBook, for processes that handle pairs independently
+    def __init__(self, window=20, entry_sigma=2, exit_tolerance=.01):
+        self.book = SignalBook(1, window, entry_sigma, exit_tolerance)
+
+    @property
+    def position(self):
+        return int(self.book.positions[0])
+
+    def update(self, ticker1_price, ticker2_price):
+        return int(self.book.update_prices([ticker1_price], [ticker2_price])[0])
+
+
+def replay(prices, pairs, window=20):
+    pairs = [tuple(pair[:2]) for pair in pairs]
+    tickers = list(dict.fromkeys(ticker for pair in pairs for ticker in pair))
+    prices = prices[tickers].sort_index()
+    columns = {ticker: j for j, ticker in enumerate(tickers)}
+    leg1 = np.array([columns[ticker1] for ticker1, _ in pairs])
+    leg2 = np.array([columns[ticker2] for _, ticker2 in pairs])
+
+    book = SignalBook(len(pairs), window)
+    streamed = np.zeros((len(prices), len(pairs)), dtype=np.int8)
+    for t, bar in enumerate(prices.to_numpy(dtype=np.float64)):
+        # A pair only advances on bars where both legs printed, like the batch backtest's dropna
+        pair_bar = (~np.isnan(bar[leg1]) & ~np.isnan(bar[leg2])).nonzero()[0]
+        book.update_prices(bar[leg1[pair_bar]], bar[leg2[pair_bar]], pair_bar)
+        streamed[t] = book.positions
+    streamed = pd.DataFrame(streamed, index=prices.index, columns=[f'{t1}-{t2}' for t1, t2 in pairs])
+
+    for name, (ticker1, ticker2) in zip(streamed.columns, pairs):
+        batch = pair_signals(prices, ticker1, ticker2, window)['Position']
+        mismatches = np.flatnonzero(streamed[name].loc[batch.index].to_numpy() != batch.to_numpy())
+        if len(mismatches):
+            raise AssertionError(f"{name}: streamed position differs from backtest on "
+                                 f"{len(mismatches)} bars, first at {batch.index[mismatches[0]]}")
+    return streamed
+
+
+if __name__ == "__main__":
+    import argparse
+    from priceStore import CSVProvider, PriceStore
+
+    parser = argparse.ArgumentParser(description="Replay stored prices bar by bar and check the streamed signals")
+    parser.add_argument('--csv-dir', help="read one CSV per symbol from this directory instead of the price store")
+    args = parser.parse_args()
+
+    pairs = [('BZ=F', 'HO=F')]
+    tickers = ['BZ=F', 'HO=F']
+    start_date, end_date = pd.Timestamp('2014-01-01'), pd.Timestamp('2024-11-01')
+    if args.csv_dir:
+        prices = CSVProvider(args.csv_dir).fetch(tickers, start_date, end_date)
+    else:
+        prices = PriceStore(universe='pairs').get(tickers, start_date, end_date)
+    streamed = replay(prices, pairs)
+    print(f"Replayed {len(streamed)} bars for {len(pairs)} pair(s); positions match the batch backtest")
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+import time
+import pandas as pd
+from asyncFetcher import AsyncFetcher
+
+
+class SlowProvider:
+    # Each request sleeps for `delay` seconds; the most requests ever in flight at once is recorded
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def fetch(self, tickers, start_date, end_date):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return pd.DataFrame({tickers[0]: [1.0]}, index=pd.DatetimeIndex([start_date]))
+
+
+def test_fetch_inside_a_running_event_loop():
+    fetcher = AsyncFetcher(SlowProvider(0), max_concurrency=2)
+
+    async def caller():
+        return fetcher.fetch(['A', 'B'], pd.Timestamp('2020-01-01'), pd.Timestamp('2020-02-01'))
+
+    data = asyncio.run(caller())
+    assert list(data.columns) == ['A', 'B']
+
+
+def test_timed_out_requests_keep_their_slot():
+    provider = SlowProvider(0.1)
+    fetcher = AsyncFetcher(provider, max_concurrency=2, retries=1, backoff=0.001, timeout=0.01)
+    fetcher.fetch(['A', 'B', 'C', 'D', 'E'], pd.Timestamp('2020-01-01'), pd.Timestamp('2020-02-01'))
+    assert (fetcher.report['Status'] == 'failed').all()
+    assert provider.peak <= 2
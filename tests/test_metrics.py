@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+import metrics
+
+
+@pytest.fixture
+def returns():
+    rng = np.random.default_rng(0)
+    prices = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, .01, (300, 3)), axis=0)), columns=['A', 'B', 'C'],
+                          index=pd.bdate_range('2020-01-01', periods=300))
+    returns = prices.pct_change()
+    returns.iloc[50:53, 1] = np.nan
+    returns.iloc[:40, 2] = np.nan
+    return returns
+
+
+@pytest.mark.parametrize('min_periods', [None, 10])
+def test_rolling_moments_match_pandas_with_nans(returns, min_periods):
+    mean, std = metrics.rolling_moments(returns.to_numpy(), 20, min_periods)
+    rolling = returns.rolling(20, min_periods=min_periods)
+    np.testing.assert_allclose(mean, rolling.mean().to_numpy(), rtol=1e-10, atol=1e-14)
+    np.testing.assert_allclose(std, rolling.std().to_numpy(), rtol=1e-10, atol=1e-14)
+
+
+def test_rolling_volatility_and_sharpe_skip_leading_nan(returns):
+    volatility = metrics.rolling_volatility(returns, 20)
+    expected = returns.rolling(20).std() * np.sqrt(metrics.TRADING_DAYS)
+    assert volatility['A'].notna().sum() == expected['A'].notna().sum() == 280
+    pd.testing.assert_frame_equal(volatility, expected, rtol=1e-10)
+
+    sharpe = metrics.rolling_sharpe(returns, 20)
+    rolling = returns.rolling(20)
+    expected = (rolling.mean() * metrics.TRADING_DAYS - .02) / (rolling.std() * np.sqrt(metrics.TRADING_DAYS))
+    pd.testing.assert_frame_equal(sharpe, expected, rtol=1e-8)
+
+
+def test_rolling_cagr_matches_pandas_with_nans(returns):
+    expected = np.exp(np.log1p(returns).rolling(20).sum() * metrics.TRADING_DAYS / 20) - 1
+    pd.testing.assert_frame_equal(metrics.rolling_cagr(returns, 20), expected, rtol=1e-10)
+
+
+def test_ratios_over_a_given_annual_return():
+    # sp500_benchmark's conventions: excess over the CAGR, sample std of the negative months
+    rng = np.random.default_rng(1)
+    monthly = pd.Series(rng.normal(.008, .04, 130))
+    growth = np.prod(1 + monthly) ** (12 / len(monthly)) - 1
+    volatility = monthly.std() * np.sqrt(12)
+    downside = monthly[monthly < 0].std() * np.sqrt(12)
+    annual_return = metrics.cagr(monthly, metrics.MONTHS)
+    assert np.isclose(annual_return, growth, rtol=1e-12)
+    assert np.isclose(metrics.sharpe_ratio(monthly, .02, metrics.MONTHS, annual_return=annual_return),
+                      (growth - .02) / volatility, rtol=1e-12)
+    assert np.isclose(metrics.sortino_ratio(monthly, .02, metrics.MONTHS, annual_return=annual_return, ddof=1),
+                      (growth - .02) / downside, rtol=1e-12)
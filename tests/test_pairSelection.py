@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pairSelection import blocked_top_pairs, top_pairs
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(np.cumsum(rng.normal(0, 1, (200, 8)), axis=0), columns=[f'T{j}' for j in range(8)])
+
+
+@pytest.mark.parametrize('top_n', [0, -1])
+def test_no_pairs_requested(data, top_n):
+    assert top_pairs(data.corr(), top_n) == []
+    assert blocked_top_pairs(data, top_n) == []
+
+
+def test_blocked_matches_full_matrix(data):
+    expected = top_pairs(data.corr(), 5)
+    found = blocked_top_pairs(data, 5, block_size=3)
+    assert [pair[:2] for pair in found] == [pair[:2] for pair in expected]
+    np.testing.assert_allclose([pair[2] for pair in found], [pair[2] for pair in expected], rtol=1e-5)
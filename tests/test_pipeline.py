@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pipeline import Pipeline
+
+TICKERS = ['A', 'B', 'C', 'D']
+
+
+@pytest.fixture
+def config(tmp_path):
+    # Per-symbol CSVs on disk stand in for the network
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2019-01-01', '2021-01-01', name='Date')
+    for ticker in TICKERS:
+        prices = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, .01, len(dates)))), index=dates, name='Adj Close')
+        prices.to_csv(tmp_path / f'{ticker}.csv')
+    return {
+        'name': 'offline',
+        'universe': {'root': str(tmp_path / 'store'),
+                     'provider': {'name': 'csv', 'location': str(tmp_path), 'rate': None}},
+        'backtest': {'start': '2019-01-01', 'end': '2021-01-01', 'pairs': [['A', 'B'], ['C', 'D']]},
+        'output': {'cache': str(tmp_path / 'cache')},
+    }
+
+
+def test_runs_from_a_csv_provider(config):
+    results = Pipeline(config).run()
+    assert results['fetch']['prices'][TICKERS].notna().all().all()
+    assert np.isfinite(results['metrics']['table'].to_numpy(dtype=float)).all()
+
+
+def test_store_only_provider_reads_without_fetching(config):
+    expected = Pipeline(config).run()
+
+    # Same store, no provider: nothing is fetched and every cached stage is reused
+    config['universe']['provider'] = {'name': None}
+    pipeline = Pipeline(config)
+    results = pipeline.run()
+    pd.testing.assert_frame_equal(results['fetch']['prices'], expected['fetch']['prices'])
+    assert pipeline.cached == {'fetch': False, 'screen': True, 'backtest': True, 'metrics': True}
+
+
+def test_unknown_provider(config):
+    config['universe']['provider'] = {'name': 'ftp'}
+    with pytest.raises(ValueError, match='Unknown price provider'):
+        Pipeline(config).run(('fetch',))
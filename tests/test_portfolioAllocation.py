@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from portfolioAllocation import PortfolioAllocator
+from portfolioBacktest import PortfolioBacktester, synthetic_prices
+
+
+@pytest.fixture(scope='module')
+def sleeves():
+    prices = synthetic_prices(20, 1500, seed=3)
+    pairs = [(f'T{2 * k}', f'T{2 * k + 1}') for k in range(10)]
+    backtester = PortfolioBacktester(pairs, prices=prices)
+    backtester.run(1.0)
+    sleeves = pd.DataFrame(backtester.returns, index=backtester.index, columns=backtester.names)
+    sleeves['ETF'] = prices['T0'].pct_change()
+    return sleeves
+
+
+def reference(allocator, returns, capital):
+    # Day by day: holdings grow with their returns, and on a rebalance row the book is revalued, charged
+    # cost_bps on the traded weight and reset to that row's targets
+    values = np.nan_to_num(returns.to_numpy())
+    targets = allocator.targets.to_numpy()
+    rebalances = set(allocator.rows.tolist())
+    held = capital * targets[0]
+    cash = capital - held.sum()
+    k = 0
+    equity, turnover = [], []
+    for t in range(len(values)):
+        if t > 0:
+            held = held * (1 + values[t])
+        value = held.sum() + cash
+        if t > 0 and t in rebalances:
+            k += 1
+            traded = np.abs(targets[k] - held / value).sum()
+            turnover.append(traded)
+            value *= 1 - allocator.cost_bps / 1e4 * traded
+            held = value * targets[k]
+            cash = value - held.sum()
+        equity.append(value)
+    return np.array(equity), np.array(turnover)
+
+
+@pytest.mark.parametrize('scheme, rebalance', [('equal', 'monthly'), ('risk_parity', 'monthly'),
+                                               ('inverse_volatility', 'drift'), ('kelly', 'monthly')])
+def test_matches_day_by_day_reference(sleeves, scheme, rebalance):
+    allocator = PortfolioAllocator(scheme, rebalance, threshold=0.02, cost_bps=10)
+    equity = allocator.run(sleeves, 1_000_000.0)
+    expected, turnover = reference(allocator, sleeves, 1_000_000.0)
+    assert len(allocator.rows) > 1
+    np.testing.assert_allclose(equity.to_numpy(), expected, rtol=1e-10)
+    np.testing.assert_allclose(allocator.rebalances['Turnover'].to_numpy(), turnover, rtol=1e-10)
+
+
+def test_monthly_rebalances_on_last_day_of_each_month(sleeves):
+    allocator = PortfolioAllocator('equal', 'monthly')
+    allocator.run(sleeves)
+    months = sleeves.index.to_period('M')
+    assert list(allocator.targets.index[1:]) == list(sleeves.index[:-1][months[1:] != months[:-1]])
+    np.testing.assert_allclose(allocator.targets.to_numpy(), 1 / sleeves.shape[1])
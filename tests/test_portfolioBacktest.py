@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from portfolioBacktest import PortfolioBacktester, backtest_pair_prices, misaligned_prices, synthetic_prices
+
+PAIRS = [(f'T{2 * k}', f'T{2 * k + 1}') for k in range(6)]
+
+
+@pytest.mark.parametrize('block_size', [None, 4])
+def test_matches_per_pair_backtest_on_misaligned_calendars(block_size):
+    prices = misaligned_prices(synthetic_prices(12, 800, seed=1))
+    equity = PortfolioBacktester(PAIRS, prices=prices, block_size=block_size).run(1000.0)
+    for ticker1, ticker2 in PAIRS:
+        alone = backtest_pair_prices(prices[[ticker1, ticker2]].dropna(), ticker1, ticker2, 1000.0)
+        np.testing.assert_allclose(equity[f'{ticker1}-{ticker2}'].loc[alone.index].iloc[1:], alone.iloc[1:],
+                                   rtol=1e-12)
+
+
+def test_pair_is_flat_on_dates_a_leg_did_not_print():
+    prices = misaligned_prices(synthetic_prices(12, 800, seed=1))
+    backtester = PortfolioBacktester(PAIRS, prices=prices)
+    backtester.run(1000.0)
+    missing = prices['T0'].reindex(backtester.index).isna().to_numpy()
+    assert missing.any()
+    assert (backtester.returns[missing, 0] == 0).all()
+
+
+@pytest.mark.parametrize('hedge', ['rolling_ols', 'kalman'])
+def test_hedged_pairs_match_their_own_calendar(hedge):
+    prices = misaligned_prices(synthetic_prices(12, 800, seed=2))
+    equity = PortfolioBacktester(PAIRS, prices=prices, hedge=hedge).run(1000.0)
+    for ticker1, ticker2 in PAIRS:
+        data = prices[[ticker1, ticker2]].dropna()
+        alone = PortfolioBacktester([(ticker1, ticker2)], prices=data, hedge=hedge).run(1000.0).iloc[:, 0]
+        np.testing.assert_allclose(equity[f'{ticker1}-{ticker2}'].loc[alone.index], alone, rtol=1e-9)
+
+
+def test_hedge_betas_survive_a_cache_hit(tmp_path):
+    from resultCache import ResultCache
+    prices = synthetic_prices(12, 800, seed=3)
+    runs = []
+    for _ in range(2):
+        backtester = PortfolioBacktester(PAIRS, prices=prices, hedge='rolling_ols', cache=ResultCache(str(tmp_path)))
+        runs.append((backtester.run(1000.0), backtester.betas.copy(), backtester.cache.hits))
+    assert runs[1][2] == len(PAIRS)
+    np.testing.assert_array_equal(runs[1][1], runs[0][1])
+    np.testing.assert_array_equal(runs[1][0], runs[0][0])
+
+
+def test_costs_only_accrue_on_a_pairs_own_dates():
+    from costModel import CostModel
+    prices = misaligned_prices(synthetic_prices(12, 800, seed=1))
+    cost_model = CostModel(borrow_rate=0.5)
+    equity = PortfolioBacktester(PAIRS, prices=prices).run(1000.0, cost_model=cost_model)
+    for ticker1, ticker2 in PAIRS:
+        alone = backtest_pair_prices(prices[[ticker1, ticker2]].dropna(), ticker1, ticker2, 1000.0,
+                                     cost_model=cost_model)
+        np.testing.assert_allclose(equity[f'{ticker1}-{ticker2}'].loc[alone.index].iloc[1:], alone.iloc[1:],
+                                   rtol=1e-12)
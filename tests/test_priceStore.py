@@ -0,0 +1,128 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+import pytest
+from asyncFetcher import AsyncFetcher
+from priceStore import HTTPCSVProvider, PriceStore
+
+DATES = pd.bdate_range('2020-01-01', '2020-12-31')
+PRICES = pd.DataFrame({ticker: 100 + np.arange(len(DATES)) + k for k, ticker in enumerate(['A', 'B', 'C'])},
+                      index=DATES)
+
+
+class PriceServer:
+    # Serves PRICES as one CSV per symbol; symbols in `failing` answer 500 and every request is logged
+    def __init__(self):
+        self.failing = set()
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                ticker = url.path.strip('/').removesuffix('.csv')
+                query = parse_qs(url.query)
+                server.requests.append(ticker)
+                if ticker in server.failing:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                rows = PRICES.loc[query['start'][0]:query['end'][0], ticker]
+                body = rows.to_csv(header=['Adj Close']).encode()
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/{{ticker}}.csv?start={{start}}&end={{end}}'
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = PriceServer()
+    yield server
+    server.close()
+
+
+def make_store(tmp_path, server):
+    fetcher = AsyncFetcher(HTTPCSVProvider(server.url), max_concurrency=4, retries=1, backoff=0.001)
+    return PriceStore(root=str(tmp_path), universe='test', provider=fetcher)
+
+
+def test_failed_extension_is_retried_on_next_refresh(tmp_path, server):
+    store = make_store(tmp_path, server)
+    store.refresh(['A', 'B'], '2020-01-01', '2020-06-01')
+
+    server.failing = {'B'}
+    store.refresh(['A', 'B'], '2020-01-01', '2020-12-31')
+    assert store.coverage['B'][1] == pd.Timestamp('2020-06-01')
+    assert store.coverage['A'][1] == pd.Timestamp('2020-12-31')
+
+    server.failing = set()
+    server.requests.clear()
+    data = make_store(tmp_path, server).get(['A', 'B'], '2020-01-01', '2020-12-31')
+    assert server.requests == ['B']
+    expected = PRICES.loc[:'2020-12-30', ['A', 'B']]
+    np.testing.assert_array_equal(data.to_numpy(), expected.to_numpy())
+
+
+def test_failed_new_ticker_is_not_stored_and_is_retried(tmp_path, server):
+    store = make_store(tmp_path, server)
+    server.failing = {'C'}
+    data = store.get(['A', 'C'], '2020-01-01', '2020-03-01')
+    assert 'C' not in store.columns and data['C'].isna().all()
+    assert store.provider.errors()['C'].startswith('HTTPError')
+
+    server.failing = set()
+    server.requests.clear()
+    data = store.get(['A', 'C'], '2020-01-01', '2020-03-01')
+    assert server.requests == ['C']
+    assert data['C'].notna().all()
+
+
+def test_covered_request_makes_no_fetches(tmp_path, server):
+    store = make_store(tmp_path, server)
+    store.refresh(['A', 'B', 'C'], '2020-01-01', '2020-12-31')
+    server.requests.clear()
+    assert not store.refresh(['A', 'B'], '2020-03-01', '2020-09-01')
+    assert server.requests == []
+
+
+class FrameProvider:
+    # Answers every request in one frame like yf.download, with all-NaN columns for symbols in `failing`
+    def __init__(self):
+        self.failing = set()
+        self.requests = []
+
+    def fetch(self, tickers, start_date, end_date):
+        self.requests.append(list(tickers))
+        data = PRICES.loc[start_date:end_date - pd.Timedelta(days=1), list(tickers)].astype(float)
+        data[list(self.failing.intersection(tickers))] = np.nan
+        return data
+
+
+def test_nan_column_does_not_extend_coverage(tmp_path):
+    provider = FrameProvider()
+    store = PriceStore(root=str(tmp_path), universe='test', provider=provider)
+    store.refresh(['A', 'B'], '2020-01-01', '2020-06-01')
+
+    provider.failing = {'B'}
+    store.refresh(['A', 'B'], '2020-01-01', '2020-12-31')
+    assert store.coverage['B'][1] == pd.Timestamp('2020-06-01')
+
+    provider.failing = set()
+    provider.requests.clear()
+    data = store.get(['A', 'B'], '2020-01-01', '2020-12-31')
+    assert provider.requests == [['B']]
+    np.testing.assert_array_equal(data.to_numpy(), PRICES.loc[:'2020-12-30', ['A', 'B']].to_numpy())
@@ -0,0 +1,31 @@
+import os
+from resultCache import ResultCache
+
+
+def test_overwrite_does_not_double_count_size(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('ab' * 20, b'x' * 1000)
+    size = cache.size
+    cache.put('ab' * 20, b'y' * 1000)
+    assert cache.size == size == ResultCache(str(tmp_path)).size
+
+
+def test_entries_removed_by_another_process(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    keys = [f'{k:02d}' * 20 for k in range(3)]
+    for key in keys:
+        cache.put(key, b'x' * 4000)
+
+    # The file disappears between the read and the mtime refresh
+    utime = os.utime
+    monkeypatch.setattr(os, 'utime', lambda path: (os.remove(path), utime(path)))
+    assert cache.get(keys[0]) == b'x' * 4000
+    monkeypatch.undo()
+
+    # And between the directory scan and the stat
+    entries = list(cache._entries())
+    os.remove(cache._path(keys[1]))
+    monkeypatch.setattr(cache, '_entries', lambda: iter(entries))
+    cache.max_bytes = 1000
+    cache.evict()
+    assert cache.size == 0 and not os.path.exists(cache._path(keys[2]))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from signalEngine import bollinger_position_series, bollinger_positions, loop_positions, synthetic_ratio_frame
+
+WINDOW = 20
+
+
+@pytest.fixture(scope='module')
+def data():
+    return synthetic_ratio_frame(2_000, WINDOW, seed=1)
+
+
+@pytest.mark.parametrize('exit_tolerance', [.01, .001])
+def test_matches_loop(data, exit_tolerance):
+    vectorized = bollinger_position_series(data, WINDOW, exit_tolerance)
+    looped = loop_positions(data, WINDOW, exit_tolerance)
+    assert vectorized.equals(looped)
+    # The series exercises every state: entries both ways, exits and bars that hold
+    assert set(looped.unique()) == {-1, 0, 1}
+    holds = (looped != 0) & (looped == looped.shift())
+    assert holds.any()
+
+
+def test_flat_through_warm_up(data):
+    # Bars inside the first window are flat even where the ratio is outside the bands
+    shifted = data.copy()
+    shifted.loc[:WINDOW - 1, ['Ratio_MA', 'Upper_Band', 'Lower_Band']] = 0.0
+    vectorized = bollinger_position_series(shifted, WINDOW)
+    assert (vectorized.iloc[:WINDOW] == 0).all()
+    assert vectorized.equals(loop_positions(shifted, WINDOW))
+
+
+# Splits at 26 and 777 fall inside an open position, 1500 while flat
+@pytest.mark.parametrize('split', [26, 777, 1_500])
+def test_initial_carries_position_across_a_split(data, split):
+    columns = [data[name].to_numpy() for name in ['Price_Ratio', 'Ratio_MA', 'Upper_Band', 'Lower_Band']]
+    whole = loop_positions(data, WINDOW).to_numpy()
+    head = bollinger_positions(*[column[:split] for column in columns], WINDOW)
+    assert (head[-1] != 0) == (split != 1_500)
+    tail = bollinger_positions(*[column[split:] for column in columns], 0, initial=head[-1])
+    np.testing.assert_array_equal(np.concatenate([head, tail]), whole)
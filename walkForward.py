@@ -0,0 +1,194 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.adfvalues import mackinnonp
+from pairSelection import top_pairs
+from pairScreening import PairScreener
+from portfolioBacktest import PortfolioBacktester
+
+
+class SlidingWindow:
+    # Tracks which rows [lo, hi) are currently summed so subclasses only add and remove the difference
+    def __init__(self):
+        self.lo = self.hi = 0
+
+    def move(self, lo, hi):
+        if lo >= self.hi or hi <= self.lo:
+            self.reset()
+            self.add(lo, hi)
+        else:
+            if lo < self.lo:
+                self.add(lo, self.lo)
+            if hi > self.hi:
+                self.add(self.hi, hi)
+            if lo > self.lo:
+                self.remove(self.lo, lo)
+            if hi < self.hi:
+                self.remove(hi, self.hi)
+        self.lo, self.hi = lo, hi
+
+    def remove(self, lo, hi):
+        self.add(lo, hi, sign=-1)
+
+
+class RollingCorrelation(SlidingWindow):
+    def __init__(self, prices):
+        super().__init__()
+        self.missing = np.isnan(prices)
+        # A fixed per-ticker shift keeps the running sums small enough to avoid cancellation
+        self.values = np.nan_to_num(prices - np.nanmean(prices, axis=0))
+        self.reset()
+
+    def reset(self):
+        n = self.values.shape[1]
+        self.count = 0
+        self.missing_count = np.zeros(n, dtype=np.int64)
+        self.sums = np.zeros(n)
+        self.products = np.zeros((n, n))
+
+    def add(self, lo, hi, sign=1):
+        rows = self.values[lo:hi]
+        self.count += sign * (hi - lo)
+        self.missing_count += sign * self.missing[lo:hi].sum(axis=0)
+        self.sums += sign * rows.sum(axis=0)
+        self.products += sign * (rows.T @ rows)
+
+    def complete(self):
+        return self.missing_count == 0
+
+    def matrix(self):
+        covariance = self.products - np.outer(self.sums, self.sums) / self.count
+        scale = np.sqrt(np.diag(covariance))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return covariance / np.outer(scale, scale)
+
+
+class RollingADF(SlidingWindow):
+    # Fixed-lag ADF with a constant, kept as running normal equations for every ticker
+    def __init__(self, prices, lags=1):
+        super().__init__()
+        self.lags = lags
+        diffs = np.diff(prices, axis=0)
+        n_rows, n = prices.shape
+        # Row t holds [x_{t-1}, 1, dx_{t-1}, ..., dx_{t-lags}, dx_t] for t >= lags + 1
+        self.rows = np.full((n_rows, n, lags + 3), np.nan)
+        start = lags + 1
+        self.rows[start:, :, 0] = prices[start - 1:-1]
+        self.rows[start:, :, 1] = 1
+        for j in range(1, lags + 1):
+            self.rows[start:, :, 1 + j] = diffs[start - 1 - j:n_rows - 1 - j]
+        self.rows[start:, :, -1] = diffs[start - 1:]
+        self.offset = start
+        self.reset()
+
+    def reset(self):
+        self.moments = np.zeros(self.rows.shape[1:] + (self.rows.shape[2],))
+        self.nobs = 0
+
+    def move(self, lo, hi):
+        # Regression rows need `lags + 1` earlier prices inside the window
+        super().move(lo + self.offset, hi)
+
+    def add(self, lo, hi, sign=1):
+        rows = np.nan_to_num(self.rows[lo:hi])
+        self.nobs += sign * (hi - lo)
+        self.moments += sign * np.einsum('tni,tnj->nij', rows, rows)
+
+    def tstats(self):
+        k = self.lags + 2
+        xtx = self.moments[:, :k, :k]
+        xty = self.moments[:, :k, k]
+        yty = self.moments[:, k, k]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xtx_inv = np.linalg.pinv(xtx)
+            coef = np.einsum('nij,nj->ni', xtx_inv, xty)
+            ssr = yty - np.einsum('ni,ni->n', coef, xty)
+            sigma2 = ssr / (self.nobs - k)
+            return coef[:, 0] / np.sqrt(sigma2 * xtx_inv[:, 0, 0])
+
+    def pvalues(self):
+        return np.array([mackinnonp(stat, regression='c', N=1) for stat in self.tstats()])
+
+
+def step_bounds(index, formation_years=3, trading_months=6):
+    steps = []
+    formation_start = index[0]
+    while True:
+        trading_start = formation_start + pd.DateOffset(years=formation_years)
+        trading_end = trading_start + pd.DateOffset(months=trading_months)
+        if trading_start >= index[-1]:
+            break
+        steps.append((formation_start, trading_start, min(trading_end, index[-1] + pd.Timedelta(days=1))))
+        formation_start = formation_start + pd.DateOffset(months=trading_months)
+    return steps
+
+
+def run_step(formation, trading, candidates, adf_pvalues, adf_threshold, coint_threshold, max_pairs,
+             coint_method, window):
+    with PairScreener(formation, adf_threshold, coint_threshold, max_workers=1, coint_method=coint_method) as screener:
+        screener.adf_cache.update(adf_pvalues)
+        selected = screener.screen(candidates, max_pairs)
+    if not selected:
+        return selected, pd.Series(0.0, index=trading.index[window:])
+
+    backtester = PortfolioBacktester(selected, window=window, prices=trading)
+    backtester.run(1.0)
+    # Equal weight across the step's pairs; the first `window` rows only warm up the bands
+    returns = pd.Series(backtester.returns.mean(axis=1), index=backtester.index)
+    return selected, returns.iloc[window:]
+
+
+def walk_forward(prices, formation_years=3, trading_months=6, top_n=20, max_pairs=20, window=20,
+                 adf_threshold=0.05, coint_threshold=0.05, adf_lags=1, coint_method='statsmodels',
+                 max_workers=None):
+    prices = prices.sort_index()
+    tickers = prices.columns
+    values = prices.to_numpy(dtype=np.float64)
+    correlation = RollingCorrelation(values)
+    adf = RollingADF(values, adf_lags)
+
+    # Screening windows overlap, so the running sums are moved forward instead of recomputed
+    jobs = []
+    steps = step_bounds(prices.index, formation_years, trading_months)
+    for formation_start, trading_start, trading_end in steps:
+        lo, mid, hi = prices.index.searchsorted([formation_start, trading_start, trading_end])
+        correlation.move(lo, mid)
+        adf.move(lo, mid)
+
+        complete = np.flatnonzero(correlation.complete())
+        matrix = pd.DataFrame(correlation.matrix()[np.ix_(complete, complete)],
+                              index=tickers[complete], columns=tickers[complete])
+        candidates = top_pairs(matrix, top_n)
+        legs = list(dict.fromkeys(ticker for pair in candidates for ticker in pair[:2]))
+        adf_pvalues = dict(zip(tickers[complete], adf.pvalues()[complete]))
+
+        formation = prices.iloc[lo:mid][legs]
+        trading = prices.iloc[max(mid - window, 0):hi][legs]
+        jobs.append((formation, trading, candidates, {ticker: adf_pvalues[ticker] for ticker in legs}))
+
+    # Each step's cointegration screen and out-of-sample backtest are independent
+    options = (adf_threshold, coint_threshold, max_pairs, coint_method, window)
+    if max_workers == 1:
+        results = [run_step(*job, *options) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = [executor.submit(run_step, *job, *options) for job in jobs]
+            results = [future.result() for future in futures]
+
+    summary = pd.DataFrame([{'Formation_Start': formation_start, 'Trading_Start': trading_start,
+                             'Trading_End': trading_end, 'Pairs': [pair[:2] for pair in selected]}
+                            for (formation_start, trading_start, trading_end), (selected, _) in zip(steps, results)])
+    returns = pd.concat([step_returns for _, step_returns in results]).rename('Strategy_Return')
+    return summary, returns
+
+
+if __name__ == "__main__":
+    from pairSearching import fetch_sp500_data
+
+    sp500_data = fetch_sp500_data('2011-01-01', '2024-11-01')
+    summary, returns = walk_forward(sp500_data)
+
+    for _, step in summary.iterrows():
+        pairs = ', '.join(f'{ticker1}-{ticker2}' for ticker1, ticker2 in step['Pairs'])
+        print(f"{step['Trading_Start']:%Y-%m-%d} to {step['Trading_End']:%Y-%m-%d}: {pairs}")
+    print(f"\nOut-of-sample cumulative return: {(1 + returns).prod() - 1:.2%}")